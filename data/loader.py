@@ -22,6 +22,54 @@ def load_camera_intrinsics(path):
     return np.array(K)
 
 
+def load_camera_transform(path):
+    """
+    Parses the camera pose in the robot frame (cam_transform) from camera.dat.
+
+    Returns:
+        4x4 transform from camera to robot coordinates
+    """
+    with open(path, "r") as f:
+        lines = f.readlines()
+
+    T = []
+
+    for i, line in enumerate(lines):
+        if "cam_transform" in line.lower():
+            for j in range(1, 5):
+                row = list(map(float, lines[i + j].strip().split()))
+                T.append(row)
+            break
+
+    if len(T) != 4:
+        raise ValueError("Could not parse camera transform")
+
+    return np.array(T)
+
+
+def load_image_size(path):
+    """
+    Parses the image width and height from camera.dat.
+
+    Returns:
+        (width, height)
+    """
+    size = {}
+
+    with open(path, "r") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            key = key.strip().lower()
+
+            if key in ("width", "height"):
+                size[key] = float(value)
+
+    if len(size) != 2:
+        raise ValueError("Could not parse image size")
+
+    return size["width"], size["height"]
+
+
 def load_measurement_file(path):
 
     keypoints = []
@@ -60,4 +108,26 @@ def load_all_measurements(data_folder):
         kpts, desc = load_measurement_file(file)
         frames.append((kpts, desc))
 
-    return frames
\ No newline at end of file
+    return frames
+
+
+def load_odometry(data_folder):
+    """
+    Reads the odom_pose header of every meas-*.dat file.
+
+    Returns:
+        Nx3 array of planar robot poses (x, y, theta), one per frame
+    """
+
+    files = sorted(glob.glob(os.path.join(data_folder, "meas-*.dat")))
+
+    odometry = []
+
+    for file in files:
+        with open(file, "r") as f:
+            for line in f:
+                if line.startswith("odom_pose:"):
+                    odometry.append(list(map(float, line.split()[1:4])))
+                    break
+
+    return np.array(odometry)
@@ -0,0 +1,276 @@
+import math
+import numpy as np
+
+from geometry.se3 import se3_inverse
+
+
+class RunningStats:
+    """
+    Welford's running mean and variance.
+    """
+
+    def __init__(self):
+
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def update(self, x):
+
+        self.count += 1
+
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+
+    @property
+    def variance(self):
+
+        if self.count < 2:
+            return 0.0
+
+        return self.m2 / (self.count - 1)
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+
+class P2Quantile:
+    """
+    Streaming estimate of the p-quantile with the P-square algorithm
+    (Jain & Chlamtac): five markers, O(1) memory and time per sample.
+    """
+
+    def __init__(self, p):
+
+        self.p = p
+
+        self.count = 0
+        self.heights = []
+        self.positions = [1, 2, 3, 4, 5]
+        self.desired = [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]
+        self.increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def update(self, x):
+
+        self.count += 1
+
+        q = self.heights
+
+        if self.count <= 5:
+            q.append(x)
+            q.sort()
+            return
+
+        n = self.positions
+
+        # Cell containing x, stretching the extreme markers if needed
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+
+        for i in range(k + 1, 5):
+            n[i] += 1
+
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        # Move the middle markers towards their desired positions
+        for i in range(1, 4):
+
+            d = self.desired[i] - n[i]
+
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+
+                d = 1 if d > 0 else -1
+
+                q_new = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+                )
+
+                if not q[i - 1] < q_new < q[i + 1]:
+                    q_new = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+
+                q[i] = q_new
+                n[i] += d
+
+    @property
+    def value(self):
+
+        if self.count == 0:
+            return None
+
+        if self.count <= 5:
+            return float(np.percentile(self.heights, 100 * self.p))
+
+        return self.heights[2]
+
+
+class StreamingMetric:
+    """
+    Running mean/std, quantiles and an exponentially weighted mean of
+    one per-step error.
+    """
+
+    def __init__(self, quantiles=(0.5, 0.95), smoothing=0.1):
+
+        self.stats = RunningStats()
+        self.quantiles = {p: P2Quantile(p) for p in quantiles}
+
+        self.smoothing = smoothing
+        self.recent = None
+
+    def update(self, x):
+
+        self.stats.update(x)
+
+        for sketch in self.quantiles.values():
+            sketch.update(x)
+
+        if self.recent is None:
+            self.recent = x
+        else:
+            self.recent += self.smoothing * (x - self.recent)
+
+    def summary(self):
+
+        summary = {
+            "count": self.stats.count,
+            "mean": self.stats.mean,
+            "std": self.stats.std
+        }
+
+        for p, sketch in self.quantiles.items():
+            summary[f"p{int(round(100 * p))}"] = sketch.value
+
+        return summary
+
+
+class StreamingTrajectoryEvaluator:
+    """
+    Frame-by-frame counterpart of evaluate_trajectory.
+
+    Only the previous estimated and groundtruth poses are kept. The
+    per-step rotation error and scale ratio are the ones
+    evaluate_trajectory computes, so after a whole sequence the means
+    match the batch result.
+
+    Drift alarms:
+        rotation: the recent (exponentially weighted) rotation error
+                  exceeds max_rotation_drift
+        scale:    |log(recent scale ratio / reference)| exceeds
+                  max_scale_drift, the reference being the mean over
+                  the first `warmup` steps
+
+    on_alarm(kind, step, value) is called when a drift measure crosses
+    its threshold (once per crossing, not on every step above it).
+    """
+
+    def __init__(
+        self,
+        max_rotation_drift=None,
+        max_scale_drift=None,
+        on_alarm=None,
+        warmup=10,
+        smoothing=0.1,
+        quantiles=(0.5, 0.95)
+    ):
+
+        self.max_rotation_drift = max_rotation_drift
+        self.max_scale_drift = max_scale_drift
+        self.on_alarm = on_alarm
+        self.warmup = warmup
+
+        self.rotation_error = StreamingMetric(quantiles, smoothing)
+        self.scale_ratio = StreamingMetric(quantiles, smoothing)
+
+        self.scale_reference = None
+
+        self.prev_est = None
+        self.prev_gt = None
+
+        self.step = 0
+        self.alarm_active = {"rotation": False, "scale": False}
+        self.alarms = []   # (kind, step, value)
+
+    def update(self, T_est, T_gt):
+        """
+        Consumes the estimated and groundtruth pose of the next frame.
+        """
+
+        if self.prev_est is not None:
+
+            rel_est = se3_inverse(self.prev_est) @ T_est
+            rel_gt = se3_inverse(self.prev_gt) @ T_gt
+
+            error = se3_inverse(rel_est) @ rel_gt
+
+            self.rotation_error.update(float(np.trace(np.eye(3) - error[:3, :3])))
+
+            norm_est = np.linalg.norm(rel_est[:3, 3])
+            norm_gt = np.linalg.norm(rel_gt[:3, 3])
+
+            if norm_gt > 1e-3:
+                self.scale_ratio.update(float(norm_est / norm_gt))
+
+            self.step += 1
+            self.check_alarms()
+
+        self.prev_est = np.array(T_est, dtype=np.float64)
+        self.prev_gt = np.array(T_gt, dtype=np.float64)
+
+    @property
+    def rotation_drift(self):
+        return self.rotation_error.recent
+
+    @property
+    def scale_drift(self):
+
+        if self.scale_reference is None or self.scale_reference <= 0:
+            return None
+
+        if self.scale_ratio.recent is None or self.scale_ratio.recent <= 0:
+            return None
+
+        return abs(math.log(self.scale_ratio.recent / self.scale_reference))
+
+    def check_alarms(self):
+
+        if self.scale_reference is None and self.scale_ratio.stats.count >= self.warmup:
+            self.scale_reference = self.scale_ratio.stats.mean
+
+        self.check_alarm("rotation", self.rotation_drift, self.max_rotation_drift)
+        self.check_alarm("scale", self.scale_drift, self.max_scale_drift)
+
+    def check_alarm(self, kind, value, threshold):
+
+        if threshold is None or value is None:
+            return
+
+        above = value > threshold
+
+        if above and not self.alarm_active[kind]:
+
+            self.alarms.append((kind, self.step, value))
+
+            if self.on_alarm is not None:
+                self.on_alarm(kind, self.step, value)
+
+        self.alarm_active[kind] = above
+
+    def summary(self):
+
+        return {
+            "rotation_error": self.rotation_error.summary(),
+            "scale_ratio": self.scale_ratio.summary(),
+            "alarms": list(self.alarms)
+        }
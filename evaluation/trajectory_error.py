@@ -1,25 +1,5 @@
 import numpy as np
-from geometry.se3 import se3_inverse
-
-
-def pose2d_to_se3(x, y, theta):
-    """
-    Converts planar pose (x, y, theta) to SE(3).
-    """
-    T = np.eye(4)
-
-    c = np.cos(theta)
-    s = np.sin(theta)
-
-    T[0, 0] = c
-    T[0, 1] = -s
-    T[1, 0] = s
-    T[1, 1] = c
-
-    T[0, 3] = x
-    T[1, 3] = y
-
-    return T
+from geometry.se3 import se3_inverse, se3_inverse_batch, pose2d_to_se3
 
 
 def load_groundtruth(path):
@@ -47,42 +27,52 @@ def compute_relative_transform(T1, T2):
     return se3_inverse(T1) @ T2
 
 
+def compute_relative_transforms(poses):
+    """
+    Relative transforms between consecutive poses.
+
+    poses: Nx4x4 array, list of 4x4 arrays or Trajectory
+    Returns:
+        (N-1)x4x4 array
+    """
+    poses = np.asarray(poses)
+
+    return se3_inverse_batch(poses[:-1]) @ poses[1:]
+
+
 def evaluate_trajectory(estimated_poses, gt_poses):
     """
     Computes relative pose errors.
-    """
 
-    rot_errors = []
-    trans_ratios = []
+    estimated_poses: Trajectory (paired with groundtruth by frame id) or
+                     array of poses for consecutive frames from frame 0
+    """
 
-    for i in range(len(estimated_poses) - 1):
+    frame_ids = getattr(estimated_poses, "frame_ids", None)
 
-        rel_est = compute_relative_transform(
-            estimated_poses[i],
-            estimated_poses[i + 1]
-        )
+    estimated_poses = np.asarray(estimated_poses)
+    gt_poses = np.asarray(gt_poses)
 
-        rel_gt = compute_relative_transform(
-            gt_poses[i],
-            gt_poses[i + 1]
-        )
+    if frame_ids is not None:
+        gt_poses = gt_poses[frame_ids]
+    else:
+        gt_poses = gt_poses[:len(estimated_poses)]
 
-        error = se3_inverse(rel_est) @ rel_gt
+    rel_est = compute_relative_transforms(estimated_poses)
+    rel_gt = compute_relative_transforms(gt_poses)
 
-        # Rotation error
-        R_error = error[:3, :3]
-        rot_error = np.trace(np.eye(3) - R_error)
-        rot_errors.append(rot_error)
+    error = se3_inverse_batch(rel_est) @ rel_gt
 
-        # Translation ratio (scale consistency)
-        t_est = rel_est[:3, 3]
-        t_gt = rel_gt[:3, 3]
+    # Rotation error
+    R_error = error[:, :3, :3]
+    rot_errors = 3.0 - np.trace(R_error, axis1=1, axis2=2)
 
-        norm_est = np.linalg.norm(t_est)
-        norm_gt = np.linalg.norm(t_gt)
+    # Translation ratio (scale consistency)
+    norm_est = np.linalg.norm(rel_est[:, :3, 3], axis=1)
+    norm_gt = np.linalg.norm(rel_gt[:, :3, 3], axis=1)
 
-        if norm_gt > 1e-3:
-            trans_ratios.append(norm_est / norm_gt)
+    valid = norm_gt > 1e-3
+    trans_ratios = norm_est[valid] / norm_gt[valid]
 
     print("Scale ratios sample:", trans_ratios[:10])
 
@@ -19,6 +19,21 @@ def project_point(K: np.ndarray, X: np.ndarray) -> np.ndarray:
     return np.array([u, v])
 
 
+def project_points(K: np.ndarray, X: np.ndarray) -> np.ndarray:
+    """
+    Projects N 3D points (in camera frame) into image coordinates.
+
+    X: Nx3 points in camera frame
+
+    Returns:
+        Nx2 image coordinates
+    """
+    u = K[0, 0] * X[:, 0] / X[:, 2] + K[0, 2]
+    v = K[1, 1] * X[:, 1] / X[:, 2] + K[1, 2]
+
+    return np.stack([u, v], axis=1)
+
+
 def projection_jacobian(K: np.ndarray, X: np.ndarray) -> np.ndarray:
     """
     Computes the Jacobian of the projection function wrt the 3D point X.
@@ -37,3 +52,76 @@ def projection_jacobian(K: np.ndarray, X: np.ndarray) -> np.ndarray:
     ])
 
     return J
+
+
+def projection_jacobians(K: np.ndarray, X: np.ndarray) -> np.ndarray:
+    """
+    Jacobians of the projection function wrt N 3D points.
+
+    X: Nx3 points in camera frame
+
+    Returns:
+        Nx2x3 Jacobian matrices
+    """
+    fx = K[0, 0]
+    fy = K[1, 1]
+
+    x, y, z = X.T
+
+    J = np.zeros((len(X), 2, 3))
+
+    J[:, 0, 0] = fx / z
+    J[:, 0, 2] = -fx * x / (z * z)
+    J[:, 1, 1] = fy / z
+    J[:, 1, 2] = -fy * y / (z * z)
+
+    return J
+
+
+def frustum_planes(
+    K: np.ndarray,
+    T: np.ndarray,
+    width: float,
+    height: float,
+    near: float = 0.0,
+    far: float = np.inf
+) -> np.ndarray:
+    """
+    Bounding planes of the viewing frustum in world coordinates.
+
+    T: 4x4 pose matrix (world to camera)
+    A world point X is inside when n . X + d >= 0 for every plane.
+
+    Returns:
+        Mx4 array of unit-normal planes (n, d); M is 6, or 5 if far is
+        infinite
+    """
+    fx = K[0, 0]
+    fy = K[1, 1]
+    cx = K[0, 2]
+    cy = K[1, 2]
+
+    # Camera frame: 0 <= u <= width, 0 <= v <= height, near <= z <= far
+    planes = [
+        [fx, 0.0, cx, 0.0],
+        [-fx, 0.0, width - cx, 0.0],
+        [0.0, fy, cy, 0.0],
+        [0.0, -fy, height - cy, 0.0],
+        [0.0, 0.0, 1.0, -near]
+    ]
+
+    if np.isfinite(far):
+        planes.append([0.0, 0.0, -1.0, far])
+
+    planes = np.array(planes)
+    planes /= np.linalg.norm(planes[:, :3], axis=1, keepdims=True)
+
+    # n_c . (R X + t) + d = (R^T n_c) . X + (n_c . t + d)
+    R = T[:3, :3]
+    t = T[:3, 3]
+
+    world = np.empty_like(planes)
+    world[:, :3] = planes[:, :3] @ R
+    world[:, 3] = planes[:, :3] @ t + planes[:, 3]
+
+    return world
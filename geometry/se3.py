@@ -12,6 +12,25 @@ def skew(v: np.ndarray) -> np.ndarray:
     ])
 
 
+def skew_batch(v: np.ndarray) -> np.ndarray:
+    """
+    Returns the skew-symmetric matrices of N 3D vectors.
+
+    v: Nx3
+    Returns: Nx3x3
+    """
+    S = np.zeros((len(v), 3, 3))
+
+    S[:, 0, 1] = -v[:, 2]
+    S[:, 0, 2] = v[:, 1]
+    S[:, 1, 0] = v[:, 2]
+    S[:, 1, 2] = -v[:, 0]
+    S[:, 2, 0] = -v[:, 1]
+    S[:, 2, 1] = v[:, 0]
+
+    return S
+
+
 def so3_exp(omega: np.ndarray) -> np.ndarray:
     """
     Exponential map for SO(3) using Rodrigues' formula.
@@ -35,6 +54,93 @@ def so3_exp(omega: np.ndarray) -> np.ndarray:
     return R
 
 
+def so3_exp_batch(omega: np.ndarray) -> np.ndarray:
+    """
+    Rodrigues' formula for N rotation vectors.
+
+    omega: Nx3
+    Returns: Nx3x3 rotation matrices
+    """
+    theta = np.linalg.norm(omega, axis=1)
+
+    small = theta < 1e-10
+    theta_safe = np.where(small, 1.0, theta)
+
+    omega_hat = skew_batch(omega / theta_safe[:, None])
+
+    a = np.where(small, 0.0, np.sin(theta))[:, None, None]
+    b = np.where(small, 0.0, 1 - np.cos(theta))[:, None, None]
+
+    return np.eye(3) + a * omega_hat + b * (omega_hat @ omega_hat)
+
+
+def so3_log_batch(R: np.ndarray) -> np.ndarray:
+    """
+    Logarithm map for N rotation matrices.
+
+    R: Nx3x3
+    Returns: Nx3 rotation vectors
+    """
+    cos_theta = np.clip((np.trace(R, axis1=1, axis2=2) - 1) / 2, -1.0, 1.0)
+    theta = np.arccos(cos_theta)
+
+    w = np.stack([
+        R[:, 2, 1] - R[:, 1, 2],
+        R[:, 0, 2] - R[:, 2, 0],
+        R[:, 1, 0] - R[:, 0, 1]
+    ], axis=1)
+
+    small = theta < 1e-6
+    sin_theta = np.where(small, 1.0, np.sin(theta))
+
+    factor = np.where(small, 0.5, theta / (2 * sin_theta))
+
+    omega = factor[:, None] * w
+
+    # Near pi the antisymmetric part vanishes: recover the axis from R + I
+    near_pi = np.pi - theta < 1e-4
+
+    for n in np.flatnonzero(near_pi):
+
+        B = (R[n] + np.eye(3)) / 2
+        k = np.argmax(np.diag(B))
+
+        axis = B[:, k] / np.sqrt(max(B[k, k], 1e-12))
+        axis /= np.linalg.norm(axis)
+
+        if np.dot(axis, w[n]) < 0:
+            axis = -axis
+
+        omega[n] = theta[n] * axis
+
+    return omega
+
+
+def so3_right_jacobian_inverse_batch(omega: np.ndarray) -> np.ndarray:
+    """
+    Inverse right Jacobians of SO(3) at N rotation vectors, so that
+    so3_log(R @ so3_exp(d)) ~ so3_log(R) + Jr^-1 @ d.
+
+    omega: Nx3
+    Returns: Nx3x3
+    """
+    theta = np.linalg.norm(omega, axis=1)
+
+    small = theta < 1e-6
+    theta_safe = np.where(small, 1.0, theta)
+
+    c = np.where(
+        small,
+        1.0 / 12.0,
+        1.0 / theta_safe ** 2
+        - (1 + np.cos(theta_safe)) / (2 * theta_safe * np.sin(theta_safe))
+    )
+
+    W = skew_batch(omega)
+
+    return np.eye(3) + 0.5 * W + c[:, None, None] * (W @ W)
+
+
 def se3_exp(xi: np.ndarray) -> np.ndarray:
     """
     Exponential map for SE(3).
@@ -93,6 +199,25 @@ def se3_inverse(T: np.ndarray) -> np.ndarray:
     return T_inv
 
 
+def se3_inverse_batch(T: np.ndarray) -> np.ndarray:
+    """
+    Computes the inverse of a stack of SE(3) matrices.
+
+    T: Nx4x4
+    Returns:
+        Nx4x4 array of inverses
+    """
+    R_t = np.swapaxes(T[:, :3, :3], 1, 2)
+    t = T[:, :3, 3]
+
+    T_inv = np.zeros_like(T)
+    T_inv[:, :3, :3] = R_t
+    T_inv[:, :3, 3] = -np.einsum("nij,nj->ni", R_t, t)
+    T_inv[:, 3, 3] = 1.0
+
+    return T_inv
+
+
 def se3_compose(T1: np.ndarray, T2: np.ndarray) -> np.ndarray:
     """
     Composition of two SE(3) transformations.
@@ -113,3 +238,33 @@ def transform_point(T: np.ndarray, X: np.ndarray) -> np.ndarray:
     X_trans = T @ X_h
 
     return X_trans[:3]
+
+
+def transform_points(T: np.ndarray, X: np.ndarray) -> np.ndarray:
+    """
+    Applies SE(3) transformation to N 3D points.
+
+    X: Nx3 points
+    Returns transformed Nx3 points
+    """
+    return X @ T[:3, :3].T + T[:3, 3]
+
+
+def pose2d_to_se3(x, y, theta):
+    """
+    Converts planar pose (x, y, theta) to SE(3).
+    """
+    T = np.eye(4)
+
+    c = np.cos(theta)
+    s = np.sin(theta)
+
+    T[0, 0] = c
+    T[0, 1] = -s
+    T[1, 0] = s
+    T[1, 1] = c
+
+    T[0, 3] = x
+    T[1, 3] = y
+
+    return T
@@ -0,0 +1,52 @@
+import numpy as np
+
+from geometry.se3 import so3_exp_batch
+
+
+def sim3_scale_batch(S: np.ndarray) -> np.ndarray:
+    """
+    Scale factors of N similarity transforms [sR | t].
+
+    S: Nx4x4
+    Returns: N scales
+    """
+    return np.cbrt(np.linalg.det(S[:, :3, :3]))
+
+
+def sim3_inverse_batch(S: np.ndarray) -> np.ndarray:
+    """
+    Inverses of N similarity transforms [sR | t].
+
+    S: Nx4x4
+    Returns: Nx4x4
+    """
+    s = sim3_scale_batch(S)
+
+    # (sR)^-1 = R^T / s = (sR)^T / s^2
+    M_inv = np.swapaxes(S[:, :3, :3], 1, 2) / (s ** 2)[:, None, None]
+
+    S_inv = np.zeros_like(S)
+    S_inv[:, :3, :3] = M_inv
+    S_inv[:, :3, 3] = -np.einsum("nij,nj->ni", M_inv, S[:, :3, 3])
+    S_inv[:, 3, 3] = 1.0
+
+    return S_inv
+
+
+def sim3_retract_batch(S: np.ndarray, delta: np.ndarray) -> np.ndarray:
+    """
+    Applies local updates S <- S @ [e^sigma so3_exp(omega) | rho].
+
+    This decoupled chart agrees with the Sim(3) exponential to first
+    order and is exactly inverted by reading back (rho, omega, sigma).
+
+    S: Nx4x4
+    delta: Nx7 [rho, omega, sigma]
+    Returns: Nx4x4
+    """
+    D = np.zeros_like(S)
+    D[:, :3, :3] = np.exp(delta[:, 6])[:, None, None] * so3_exp_batch(delta[:, 3:6])
+    D[:, :3, 3] = delta[:, :3]
+    D[:, 3, 3] = 1.0
+
+    return S @ D
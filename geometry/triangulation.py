@@ -1,6 +1,8 @@
 import numpy as np
 import cv2
 
+from geometry.projection import project_points
+
 
 def build_projection_matrix(K: np.ndarray, T: np.ndarray) -> np.ndarray:
     """
@@ -64,3 +66,84 @@ def triangulate_points_batch(
     X = X_h[:3] / X_h[3]
 
     return X.T
+
+
+def triangulate_points_multiview(
+    K: np.ndarray,
+    poses: np.ndarray,
+    points_2d: np.ndarray,
+    visible: np.ndarray = None
+):
+    """
+    Triangulates N points, each observed in any subset of V views, by
+    linear DLT with a single batched SVD.
+
+    Every point contributes two rows per observing view, written in
+    normalized camera coordinates and scaled to unit norm; views that
+    do not observe it contribute zero rows.
+
+    poses: Vx4x4 world-to-camera poses
+    points_2d: NxVx2 image coordinates (ignored where not visible)
+    visible: NxV booleans, all True if omitted
+
+    Returns:
+        points: Nx3 (NaN for points seen in fewer than two views)
+        reprojection_errors: N, RMS over the observing views in pixels
+                             (inf if the point is behind one of them)
+        conditions: N, ratio of the largest to the third singular value;
+                    large values flag near-degenerate geometry such as
+                    a small baseline
+    """
+
+    poses = np.asarray(poses, dtype=np.float64)
+    points_2d = np.asarray(points_2d, dtype=np.float64)
+
+    N, V = points_2d.shape[:2]
+
+    if visible is None:
+        visible = np.ones((N, V), dtype=bool)
+    else:
+        visible = np.asarray(visible, dtype=bool)
+
+    # Normalized camera coordinates
+    x_h = np.concatenate([points_2d, np.ones((N, V, 1))], axis=2) @ np.linalg.inv(K).T
+    x = x_h[..., :2] / x_h[..., 2:]
+
+    P = poses[:, :3, :]   # Vx3x4
+
+    # x * P3 - P1 and y * P3 - P2 for every point and view: NxVx2x4
+    A = x[..., None] * P[None, :, 2:3, :] - P[None, :, :2, :]
+
+    norms = np.linalg.norm(A, axis=3, keepdims=True)
+    A = np.where(visible[..., None, None], A / np.maximum(norms, 1e-12), 0.0)
+
+    _, s, Vt = np.linalg.svd(A.reshape(N, 2 * V, 4), full_matrices=False)
+
+    X_h = Vt[:, -1, :]
+
+    num_views = np.sum(visible, axis=1)
+    valid = num_views >= 2
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+
+        points = X_h[:, :3] / X_h[:, 3:4]
+        points[~valid] = np.nan
+
+        conditions = s[:, 0] / s[:, 2]
+
+        # Reprojection into every view
+        X_c = np.einsum("vij,nj->nvi", poses[:, :3, :3], points) + poses[:, :3, 3]
+        projected = project_points(K, X_c.reshape(-1, 3)).reshape(N, V, 2)
+
+        sq_errors = np.sum((projected - points_2d) ** 2, axis=2)
+        sq_errors = np.where(visible, sq_errors, 0.0)
+
+        reprojection_errors = np.sqrt(np.sum(sq_errors, axis=1) / num_views)
+
+    behind = np.any(visible & (X_c[..., 2] <= 0), axis=1)
+    reprojection_errors[behind] = np.inf
+
+    reprojection_errors[~valid] = np.nan
+    conditions[~valid] = np.inf
+
+    return points, reprojection_errors, conditions
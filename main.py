@@ -1,51 +1,702 @@
 import os
-from vo.visual_odometry import VisualOdometry
-from data.loader import load_camera_intrinsics, load_all_measurements
+import sys
+import time
+import argparse
+
+from data.loader import (
+    load_camera_intrinsics, load_camera_transform, load_image_size,
+    load_all_measurements, load_odometry
+)
 from evaluation.trajectory_error import load_groundtruth, evaluate_trajectory
 from evaluation.map_error import load_world_map, evaluate_map
 
+# Heavy dependencies (cv2 via the VO pipeline, matplotlib via the plots)
+# are imported inside the commands that need them, so that evaluating
+# precomputed outputs only pays for numpy.
 
-def main():
 
-    data_folder = "data"
+# -------------------------------------------------------
+# PIPELINE
+# -------------------------------------------------------
 
-    K = load_camera_intrinsics(os.path.join(data_folder, "camera.dat"))
-    frames = load_all_measurements(data_folder)
+def load_frames(args):
+    """
+    Loads the measurements, encoding descriptors for storage and
+    training the product quantizer if requested. Both quantizers are
+    fitted on the full-precision descriptors, and the PQ codes of every
+    frame are computed once here.
 
-    vo = VisualOdometry(K)
+    Returns:
+        frames, descriptor codec (or None), product quantizer (or None),
+        PQ codes per frame (or None)
+    """
 
-    # Initialization
-    kpts0, desc0 = frames[0]
-    kpts1, desc1 = frames[1]
+    import numpy as np
+    from vo.descriptor_codec import ScalarQuantizer, ProductQuantizer
+
+    frames = load_all_measurements(args.data)
+
+    descriptors = np.vstack([desc for _, desc in frames])
+
+    pq = None
+    codes = None
+
+    if args.pq_subspaces > 0:
+        pq = ProductQuantizer(num_subspaces=args.pq_subspaces).fit(descriptors)
+        codes = [pq.encode(desc) for _, desc in frames]
+
+    codec = None
+
+    if args.descriptor_storage != "float64":
+        codec = ScalarQuantizer(args.descriptor_storage).fit(descriptors)
+        frames = [(kpts, codec.encode(desc)) for kpts, desc in frames]
+
+    return frames, codec, pq, codes
+
+
+def build_keyframe_database(frames, codec):
+    """
+    Trains the visual vocabulary on the measurement descriptors.
+    """
+
+    from vo.place_recognition import Vocabulary, KeyframeDatabase
+
+    frame_descriptors = [
+        desc if codec is None else codec.decode(desc)
+        for _, desc in frames
+    ]
+
+    vocabulary = Vocabulary().train(frame_descriptors)
 
-    vo.process_first_two_frames(
-        kpts0, desc0,
-        kpts1, desc1
+    return KeyframeDatabase(vocabulary)
+
+
+def run_pipeline(K, frames, args, codec=None, pq=None, codes=None, on_frame=None):
+    """
+    Runs VO over the frames.
+
+    codes: precomputed PQ codes per frame (optional)
+
+    on_frame(vo): optional hook called after initialization and after
+                  every tracked frame; returning True stops the run.
+    """
+
+    from vo.visual_odometry import VisualOdometry
+
+    keyframe_database = None
+
+    if args.loop_detection:
+        keyframe_database = build_keyframe_database(frames, codec)
+
+    odometry = None
+    camera_transform = None
+
+    if args.pose_graph or args.pose_graph_interval > 0:
+        odometry = load_odometry(args.data)
+        camera_transform = load_camera_transform(
+            os.path.join(args.data, "camera.dat")
+        )
+
+    vo = VisualOdometry(
+        K,
+        match_threshold=args.match_threshold,
+        max_iterations=args.max_iterations,
+        min_triangulation_angle=args.min_angle,
+        descriptor_codec=codec,
+        pq=pq,
+        rerank=args.rerank,
+        keyframe_database=keyframe_database,
+        keyframe_interval=args.keyframe_interval,
+        odometry=odometry,
+        camera_transform=camera_transform,
+        pose_graph_interval=args.pose_graph_interval,
+        image_size=load_image_size(os.path.join(args.data, "camera.dat")),
+        frame_budget=None if args.frame_budget is None else args.frame_budget / 1e3
     )
 
+    # Initialization
+    next_frame = vo.process_initialization(
+        frames,
+        window=args.init_window,
+        num_workers=args.init_workers,
+        min_inliers=args.init_min_inliers,
+        min_parallax=args.init_min_parallax
+    )
+
+    if next_frame is None:
+        return vo
+
+    if on_frame is not None and on_frame(vo):
+        return vo
+
     # Tracking
-    for kpts, desc in frames[2:]:
-        vo.process_frame(kpts, desc)
+    for frame_index in range(next_frame, len(frames)):
 
-    print("VO finished.")
-    print(f"Total poses: {len(vo.poses)}")
-    print(f"Total landmarks: {len(vo.landmarks)}")
+        kpts, desc = frames[frame_index]
+
+        vo.process_frame(
+            kpts, desc,
+            codes=None if codes is None else codes[frame_index]
+        )
+
+        # Between frames: work a frame budget kept out of process_frame
+        vo.run_deferred()
+
+        if on_frame is not None and on_frame(vo):
+            print("Run aborted.")
+            return vo
+
+    if args.pose_graph:
+        vo.optimize_pose_graph()
+
+    return vo
+
+
+def compute_metrics(data_folder, poses, landmarks):
 
     gt_path = os.path.join(data_folder, "trajectory.dat")
     gt_poses = load_groundtruth(gt_path)
 
-    rot_error, scale_ratio, scale_series = evaluate_trajectory(vo.poses, gt_poses)
-
-    print("Mean rotation error:", rot_error)
-    print("Mean scale ratio:", scale_ratio)
+    rot_error, scale_ratio, scale_series = evaluate_trajectory(poses, gt_poses)
 
     world_path = os.path.join(data_folder, "world.dat")
     gt_landmarks = load_world_map(world_path)
 
-    map_rmse = evaluate_map(vo.landmarks, gt_landmarks, scale_ratio)
+    map_rmse = evaluate_map(landmarks, gt_landmarks, scale_ratio)
+
+    return {
+        "gt_poses": gt_poses,
+        "gt_landmarks": gt_landmarks,
+        "rot_error": rot_error,
+        "scale_ratio": scale_ratio,
+        "scale_series": scale_series,
+        "map_rmse": map_rmse
+    }
+
+
+def report_metrics(metrics, output_dir):
+
+    lines = [
+        f"Mean rotation error: {metrics['rot_error']}",
+        f"Mean scale ratio: {metrics['scale_ratio']}",
+        f"Map RMSE: {metrics['map_rmse']}"
+    ]
+
+    for line in lines:
+        print(line)
+
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    with open(os.path.join(output_dir, "metrics.txt"), "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+# -------------------------------------------------------
+# COMMANDS
+# -------------------------------------------------------
+
+def build_streaming_evaluator(args):
+    """
+    Returns:
+        evaluator, on_frame hook feeding it every new pose
+    """
+
+    from evaluation.streaming_error import StreamingTrajectoryEvaluator
+
+    gt_poses = load_groundtruth(os.path.join(args.data, "trajectory.dat"))
+
+    aborted = []
+
+    def on_alarm(kind, step, value):
+        print(f"Drift alarm: {kind} drift {value:.4f} at step {step}")
+
+        if args.abort_on_drift:
+            aborted.append(kind)
+
+    evaluator = StreamingTrajectoryEvaluator(
+        max_rotation_drift=args.max_rotation_drift,
+        max_scale_drift=args.max_scale_drift,
+        on_alarm=on_alarm
+    )
+
+    evaluated = [0]
+
+    def on_frame(vo):
+
+        for k in range(evaluated[0], len(vo.poses)):
+            evaluator.update(vo.poses[k], gt_poses[vo.poses.frame_ids[k]])
+
+        evaluated[0] = len(vo.poses)
+
+        return len(aborted) > 0
+
+    return evaluator, on_frame
+
+
+def report_streaming(evaluator):
+
+    summary = evaluator.summary()
+
+    for name in ("rotation_error", "scale_ratio"):
+        stats = summary[name]
+        print(
+            f"Streaming {name.replace('_', ' ')}: "
+            f"mean {stats['mean']}, std {stats['std']}, "
+            f"median {stats['p50']}, p95 {stats['p95']}"
+        )
+
+    print(f"Drift alarms: {len(summary['alarms'])}")
+
+
+def report_latency(vo):
+    """
+    Summarizes frame latencies and degradations of a real-time run.
+    """
+
+    import numpy as np
+
+    reports = vo.frame_reports
+
+    if not reports:
+        return
+
+    latencies = 1e3 * np.array([report["latency"] for report in reports])
+    budget = 1e3 * vo.frame_budget
+
+    print(
+        f"Frame latency: median {np.median(latencies):.2f} ms, "
+        f"p95 {np.percentile(latencies, 95):.2f} ms, "
+        f"max {latencies.max():.2f} ms "
+        f"({np.sum(latencies > budget)} of {len(latencies)} over "
+        f"the {budget:.1f} ms budget)"
+    )
+
+    for degradation in (
+        "subsampled", "gn_iterations", "gn_deadline", "landmarks_deferred"
+    ):
+        count = sum(degradation in report["degradations"] for report in reports)
+        print(f"Frames degraded ({degradation}): {count}")
+
+    guarded = sum(report.get("tracked_in_full", False) for report in reports)
+    print(f"Frames tracked in full to protect tracking: {guarded}")
+
+    lost = sum(report.get("tracking_lost", False) for report in reports)
+    print(f"Frames without a pose: {lost}")
+
+    deferred = 1e3 * np.array([report.get("deferred_time", 0.0) for report in reports])
+    print(
+        f"Work between frames: median {np.median(deferred):.2f} ms, "
+        f"max {deferred.max():.2f} ms"
+    )
+
+
+def cmd_run(args):
+
+    from results.vo_output import save_vo_output
+
+    K = load_camera_intrinsics(os.path.join(args.data, "camera.dat"))
+    frames, codec, pq, codes = load_frames(args)
+
+    evaluator = None
+    on_frame = None
+
+    if args.stream_eval:
+        evaluator, on_frame = build_streaming_evaluator(args)
+
+    vo = run_pipeline(K, frames, args, codec, pq, codes, on_frame=on_frame)
+
+    if evaluator is not None:
+        report_streaming(evaluator)
+
+    report_latency(vo)
+
+    print("VO finished.")
+    print(f"Total poses: {len(vo.poses)}")
+    print(f"Total landmarks: {len(vo.landmarks)}")
+
+    if args.loop_detection:
+        print(f"Loops detected: {len(vo.loops)}")
+
+    path = save_vo_output(args.output, vo.poses, vo.landmarks)
+    print(f"Saved output to {path}")
+
+    if not args.no_eval:
+        metrics = compute_metrics(args.data, vo.poses, vo.landmarks)
+        report_metrics(metrics, args.output)
+
+
+def cmd_eval(args):
+
+    from results.vo_output import load_vo_output
+
+    poses, landmarks = load_vo_output(args.output)
+
+    metrics = compute_metrics(args.data, poses, landmarks)
+    report_metrics(metrics, args.output)
+
+
+def cmd_plot(args):
+
+    from results.vo_output import load_vo_output
+    from results.visualization import (
+        plot_trajectory, plot_scale_ratio, plot_map
+    )
+
+    poses, landmarks = load_vo_output(args.output)
+
+    metrics = compute_metrics(args.data, poses, landmarks)
+
+    plots_dir = os.path.join(args.output, "plots")
+
+    plot_trajectory(poses, metrics["gt_poses"], plots_dir)
+    plot_scale_ratio(metrics["scale_series"], plots_dir)
+    plot_map(
+        landmarks, metrics["gt_landmarks"],
+        metrics["scale_ratio"], plots_dir
+    )
+
+    print(f"Plots written to {plots_dir}")
+
+
+def cmd_bench(args):
+
+    import io
+    import contextlib
+    import numpy as np
+
+    K = load_camera_intrinsics(os.path.join(args.data, "camera.dat"))
+    frames, codec, pq, codes = load_frames(args)
+
+    # Warm-up run also pays the cv2 import
+    with contextlib.redirect_stdout(io.StringIO()):
+        run_pipeline(K, frames, args, codec, pq, codes)
+
+    timings = []
+
+    for _ in range(args.repeat):
+
+        start = time.perf_counter()
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            run_pipeline(K, frames, args, codec, pq, codes)
+
+        timings.append(time.perf_counter() - start)
+
+    timings = np.array(timings)
+    per_frame = timings / len(frames)
+
+    print(f"Frames: {len(frames)}, runs: {args.repeat}")
+    print(f"Sequence time: mean {timings.mean():.4f} s, "
+          f"min {timings.min():.4f} s, max {timings.max():.4f} s")
+    print(f"Per frame: mean {1e3 * per_frame.mean():.2f} ms")
+
+
+def cmd_serve(args):
+
+    from service.server import run_server
+
+    run_server(
+        args.socket,
+        workers=args.workers,
+        max_sessions=args.max_sessions,
+        queue_size=args.queue_size
+    )
+
+
+def cmd_replay(args):
+
+    import asyncio
+    from service.client import replay_sessions
+
+    options = {
+        "match_threshold": args.match_threshold,
+        "max_iterations": args.max_iterations,
+        "min_triangulation_angle": args.min_angle,
+        "init_window": args.init_window,
+        "init_min_inliers": args.init_min_inliers,
+        "init_min_parallax": args.init_min_parallax
+    }
+
+    if args.frame_budget is not None:
+        options["frame_budget"] = args.frame_budget / 1e3
+
+    options["image_size"] = list(
+        load_image_size(os.path.join(args.data, "camera.dat"))
+    )
+
+    throughput = []
+
+    for sessions in args.sessions:
+
+        results, elapsed = asyncio.run(replay_sessions(
+            args.socket, args.data,
+            sessions=sessions,
+            options=options,
+            rate=args.rate
+        ))
+
+        total_frames = 0
+
+        for poses, summary in results:
+
+            total_frames += summary["frames"]
+
+            print(
+                f"Session {summary['session']}: {len(poses)} poses received, "
+                f"{summary['landmarks']} landmarks, "
+                f"{summary['degraded_frames']} degraded frames, "
+                f"{summary['processing_time']:.2f} s processing"
+            )
+
+        print(f"Replayed {sessions} sessions in {elapsed:.2f} s "
+              f"({total_frames / elapsed:.1f} frames/s)")
+
+        throughput.append(total_frames / elapsed)
+
+    if len(args.sessions) > 1:
+
+        print("Scaling (frames/s, speedup over the first count):")
+
+        for sessions, rate in zip(args.sessions, throughput):
+            print(f"  {sessions:3d} sessions: {rate:8.1f}  x{rate / throughput[0]:.2f}")
+
+
+# -------------------------------------------------------
+# ARGUMENTS
+# -------------------------------------------------------
+
+def add_common_arguments(parser):
+
+    parser.add_argument(
+        "--data", default="data",
+        help="folder with camera.dat, meas-*.dat, trajectory.dat, world.dat"
+    )
+    parser.add_argument(
+        "--output", default="output",
+        help="folder for the VO output, metrics and plots"
+    )
+
+
+def add_pipeline_arguments(parser):
+
+    parser.add_argument(
+        "--match-threshold", type=float, default=0.5,
+        help="maximum descriptor distance for a match"
+    )
+    parser.add_argument(
+        "--max-iterations", type=int, default=10,
+        help="Gauss-Newton iterations per frame"
+    )
+    parser.add_argument(
+        "--min-angle", type=float, default=1.0,
+        help="minimum triangulation angle in degrees"
+    )
+    parser.add_argument(
+        "--descriptor-storage", default="float64",
+        choices=["float64", "float16", "int8"],
+        help="precision descriptors are kept in after loading"
+    )
+    parser.add_argument(
+        "--pq-subspaces", type=int, default=0,
+        help="match with product quantization over this many subspaces "
+             "(0 matches at full precision)"
+    )
+    parser.add_argument(
+        "--rerank", type=int, default=4,
+        help="candidates per descriptor re-ranked exactly with PQ matching"
+    )
+    parser.add_argument(
+        "--loop-detection", action="store_true",
+        help="detect revisited places with a keyframe database"
+    )
+    parser.add_argument(
+        "--keyframe-interval", type=int, default=5,
+        help="frames between keyframes for loop detection"
+    )
+    parser.add_argument(
+        "--pose-graph", action="store_true",
+        help="optimize the trajectory with odometry in a pose graph at the end"
+    )
+    parser.add_argument(
+        "--pose-graph-interval", type=int, default=0,
+        help="also optimize the pose graph every N frames (0 disables)"
+    )
+    parser.add_argument(
+        "--frame-budget", type=float, default=None,
+        help="per-frame latency budget in ms; frames degrade gracefully "
+             "to meet it (default: no budget)"
+    )
+    parser.add_argument(
+        "--init-window", type=int, default=8,
+        help="initialize from the best pair (0, k) with k up to this value"
+    )
+    parser.add_argument(
+        "--init-workers", type=int, default=4,
+        help="threads evaluating initialization candidates"
+    )
+    parser.add_argument(
+        "--init-min-inliers", type=int, default=50,
+        help="inliers needed for an initialization pair to be accepted"
+    )
+    parser.add_argument(
+        "--init-min-parallax", type=float, default=3.0,
+        help="median parallax in degrees needed to accept a pair"
+    )
+
+
+def build_parser():
+
+    parser = argparse.ArgumentParser(
+        description="Monocular visual odometry pipeline"
+    )
+
+    subparsers = parser.add_subparsers(dest="command")
+
+    run_parser = subparsers.add_parser(
+        "run", help="run VO on a sequence and save its output"
+    )
+    add_common_arguments(run_parser)
+    add_pipeline_arguments(run_parser)
+    run_parser.add_argument(
+        "--no-eval", action="store_true",
+        help="skip evaluation after the run"
+    )
+    run_parser.add_argument(
+        "--stream-eval", action="store_true",
+        help="evaluate against groundtruth frame by frame during the run"
+    )
+    run_parser.add_argument(
+        "--max-rotation-drift", type=float, default=None,
+        help="alarm when the recent rotation error exceeds this value"
+    )
+    run_parser.add_argument(
+        "--max-scale-drift", type=float, default=None,
+        help="alarm when |log(recent / initial scale ratio)| exceeds this value"
+    )
+    run_parser.add_argument(
+        "--abort-on-drift", action="store_true",
+        help="stop the run at the first drift alarm"
+    )
+    run_parser.set_defaults(func=cmd_run)
+
+    eval_parser = subparsers.add_parser(
+        "eval", help="evaluate a saved VO output against groundtruth"
+    )
+    add_common_arguments(eval_parser)
+    eval_parser.set_defaults(func=cmd_eval)
+
+    plot_parser = subparsers.add_parser(
+        "plot", help="plot a saved VO output against groundtruth"
+    )
+    add_common_arguments(plot_parser)
+    plot_parser.set_defaults(func=cmd_plot)
+
+    bench_parser = subparsers.add_parser(
+        "bench", help="time the pipeline over repeated runs"
+    )
+    add_common_arguments(bench_parser)
+    add_pipeline_arguments(bench_parser)
+    bench_parser.add_argument(
+        "--repeat", type=int, default=5,
+        help="number of timed runs"
+    )
+    bench_parser.set_defaults(func=cmd_bench)
+
+    serve_parser = subparsers.add_parser(
+        "serve", help="serve VO sessions to clients over a local socket"
+    )
+    serve_parser.add_argument(
+        "--socket", default="/tmp/vo.sock",
+        help="path of the Unix socket to listen on"
+    )
+    serve_parser.add_argument(
+        "--workers", type=int, default=None,
+        help="worker processes; each session runs whole in one of them "
+             "(default: CPU count, or 0 on a single core; 0 runs sessions "
+             "in server threads)"
+    )
+    serve_parser.add_argument(
+        "--max-sessions", type=int, default=16,
+        help="sessions processing frames at the same time with --workers 0"
+    )
+    serve_parser.add_argument(
+        "--queue-size", type=int, default=4,
+        help="frames read ahead per session before the client is throttled"
+    )
+    serve_parser.set_defaults(func=cmd_serve)
+
+    replay_parser = subparsers.add_parser(
+        "replay", help="stream the measurements to a running VO service"
+    )
+    replay_parser.add_argument(
+        "--data", default="data",
+        help="folder with camera.dat and meas-*.dat"
+    )
+    replay_parser.add_argument(
+        "--socket", default="/tmp/vo.sock",
+        help="path of the service's Unix socket"
+    )
+    replay_parser.add_argument(
+        "--sessions", type=int, nargs="+", default=[1],
+        help="number of robots replaying the sequence concurrently; "
+             "several values replay once per count and report the scaling"
+    )
+    replay_parser.add_argument(
+        "--rate", type=float, default=None,
+        help="frames per second per session (default: as fast as served)"
+    )
+    replay_parser.add_argument(
+        "--match-threshold", type=float, default=0.5,
+        help="maximum descriptor distance for a match"
+    )
+    replay_parser.add_argument(
+        "--max-iterations", type=int, default=10,
+        help="Gauss-Newton iterations per frame"
+    )
+    replay_parser.add_argument(
+        "--min-angle", type=float, default=1.0,
+        help="minimum triangulation angle in degrees"
+    )
+    replay_parser.add_argument(
+        "--frame-budget", type=float, default=None,
+        help="per-frame latency budget in ms for the sessions"
+    )
+    replay_parser.add_argument(
+        "--init-window", type=int, default=8,
+        help="initialize from the best pair (0, k) with k up to this value"
+    )
+    replay_parser.add_argument(
+        "--init-min-inliers", type=int, default=50,
+        help="inliers needed for an initialization pair to be accepted"
+    )
+    replay_parser.add_argument(
+        "--init-min-parallax", type=float, default=3.0,
+        help="median parallax in degrees needed to accept a pair"
+    )
+    replay_parser.set_defaults(func=cmd_replay)
+
+    return parser
+
+
+def main(argv=None):
+
+    if argv is None:
+        argv = sys.argv[1:]
+
+    # Without a subcommand, behave like a full run
+    if not argv:
+        argv = ["run"]
+
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    if args.command is None:
+        parser.print_help()
+        return
 
-    print("Map RMSE:", map_rmse)
+    args.func(args)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -12,8 +12,8 @@ def plot_trajectory(estimated_poses, gt_poses, save_path):
 
     ensure_dir(save_path)
 
-    est_positions = np.array([T[:3, 3] for T in estimated_poses])
-    gt_positions = np.array([T[:3, 3] for T in gt_poses])
+    est_positions = np.asarray(estimated_poses)[:, :3, 3]
+    gt_positions = np.asarray(gt_poses)[:, :3, 3]
 
     plt.figure()
     plt.plot(est_positions[:, 0], est_positions[:, 1])
@@ -0,0 +1,69 @@
+import os
+import numpy as np
+
+from vo.trajectory import Trajectory
+
+
+OUTPUT_FILENAME = "vo_output.npz"
+
+
+def save_vo_output(output_dir, poses, landmarks):
+    """
+    Saves estimated poses and landmarks so they can be evaluated or
+    plotted later without re-running the pipeline.
+
+    poses: Trajectory
+    landmarks: dict {landmark_id: 3D point}
+
+    Returns:
+        path of the written file
+    """
+
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    landmark_ids = np.array(list(landmarks.keys()), dtype=np.int64)
+    landmark_points = np.array(list(landmarks.values())).reshape(-1, 3)
+
+    path = os.path.join(output_dir, OUTPUT_FILENAME)
+
+    np.savez(
+        path,
+        poses=np.asarray(poses),
+        frame_ids=poses.frame_ids,
+        timestamps=poses.timestamps,
+        landmark_ids=landmark_ids,
+        landmark_points=landmark_points
+    )
+
+    return path
+
+
+def load_vo_output(output_dir):
+    """
+    Loads the output written by save_vo_output.
+
+    Returns:
+        poses: Trajectory
+        landmarks: dict {landmark_id: 3D point}
+    """
+
+    path = os.path.join(output_dir, OUTPUT_FILENAME)
+
+    with np.load(path) as data:
+
+        poses = Trajectory(capacity=len(data["poses"]))
+
+        for T, frame_id, timestamp in zip(
+            data["poses"], data["frame_ids"], data["timestamps"]
+        ):
+            poses.append(T, frame_id=frame_id, timestamp=timestamp)
+
+        landmarks = {
+            int(landmark_id): X
+            for landmark_id, X in zip(
+                data["landmark_ids"], data["landmark_points"]
+            )
+        }
+
+    return poses, landmarks
@@ -0,0 +1,104 @@
+import os
+import time
+import asyncio
+
+from data.loader import load_camera_intrinsics, load_all_measurements
+from vo.trajectory import Trajectory
+from service.protocol import (
+    MSG_HELLO, MSG_FRAME, MSG_END, MSG_POSE, MSG_DONE, MSG_ERROR,
+    read_message, write_message,
+    encode_json, decode_json, encode_frame, decode_pose
+)
+
+
+async def replay(path, K, frames, options=None, rate=None):
+    """
+    Streams recorded frames to the VO service like a robot would.
+
+    rate: frames per second to send at (None sends as fast as the
+          service accepts them)
+
+    Returns:
+        received poses (Trajectory), session summary from the server
+    """
+
+    reader, writer = await asyncio.open_unix_connection(path)
+
+    write_message(writer, MSG_HELLO, encode_json({
+        "K": K.tolist(),
+        "options": options or {}
+    }))
+
+    async def send():
+
+        start = time.perf_counter()
+
+        for sequence, (kpts, desc) in enumerate(frames):
+
+            if rate is not None:
+                delay = start + sequence / rate - time.perf_counter()
+
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+            write_message(writer, MSG_FRAME, encode_frame(sequence, kpts, desc))
+
+            # Waits while the service is not reading (backpressure)
+            await writer.drain()
+
+        write_message(writer, MSG_END)
+        await writer.drain()
+
+    sender = asyncio.create_task(send())
+
+    poses = Trajectory()
+    summary = None
+
+    try:
+        while summary is None:
+
+            message = await read_message(reader)
+
+            if message is None:
+                raise ConnectionError("Service closed the stream")
+
+            msg_type, payload = message
+
+            if msg_type == MSG_POSE:
+                frame_id, T = decode_pose(payload)
+                poses.append(T, frame_id=frame_id, timestamp=time.time())
+
+            elif msg_type == MSG_DONE:
+                summary = decode_json(payload)
+
+            elif msg_type == MSG_ERROR:
+                raise RuntimeError(f"Service error: {payload.decode('utf-8')}")
+
+        await sender
+
+    finally:
+        sender.cancel()
+        writer.close()
+
+    return poses, summary
+
+
+async def replay_sessions(path, data_folder, sessions=1, options=None, rate=None):
+    """
+    Replays the data folder's measurements as several concurrent robots.
+
+    Returns:
+        list of (poses, summary) per session, wall-clock time
+    """
+
+    K = load_camera_intrinsics(os.path.join(data_folder, "camera.dat"))
+    frames = load_all_measurements(data_folder)
+
+    start = time.perf_counter()
+
+    results = await asyncio.gather(*[
+        replay(path, K, frames, options=options, rate=rate)
+        for _ in range(sessions)
+    ])
+
+    return results, time.perf_counter() - start
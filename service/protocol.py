@@ -0,0 +1,117 @@
+import json
+import struct
+import numpy as np
+
+
+# Every message is a 5-byte header (type, payload length) followed by
+# the payload. Header fields are big-endian, arrays little-endian float64.
+
+HEADER = struct.Struct("!BI")
+
+MSG_HELLO = 1   # client -> server, JSON {"K": 3x3, "options": {...}}
+MSG_FRAME = 2   # client -> server, one measurement frame
+MSG_END = 3     # client -> server, no more frames
+MSG_POSE = 4    # server -> client, one estimated pose
+MSG_DONE = 5    # server -> client, JSON session summary
+MSG_ERROR = 6   # server -> client, UTF-8 error message
+
+MAX_PAYLOAD = 64 * 1024 * 1024
+
+FRAME_HEADER = struct.Struct("!III")   # sequence number, points, descriptor size
+POSE_HEADER = struct.Struct("!I")      # frame id
+
+FLOAT = np.dtype("<f8")
+
+
+async def read_message(reader):
+    """
+    Returns:
+        (message type, payload), or None at end of stream
+    """
+
+    try:
+        header = await reader.readexactly(HEADER.size)
+    except EOFError:
+        return None
+
+    msg_type, length = HEADER.unpack(header)
+
+    if length > MAX_PAYLOAD:
+        raise ValueError(f"Message payload too large: {length} bytes")
+
+    payload = await reader.readexactly(length)
+
+    return msg_type, payload
+
+
+def write_message(writer, msg_type, payload=b""):
+    """
+    Queues a message on a StreamWriter; the caller awaits drain().
+    """
+
+    writer.write(HEADER.pack(msg_type, len(payload)) + payload)
+
+
+def encode_json(obj):
+    return json.dumps(obj).encode("utf-8")
+
+
+def decode_json(payload):
+    return json.loads(payload.decode("utf-8"))
+
+
+def encode_frame(sequence, keypoints, descriptors):
+
+    keypoints = np.asarray(keypoints, dtype=FLOAT).reshape(-1, 2)
+    descriptors = np.asarray(descriptors, dtype=FLOAT)
+    descriptors = descriptors.reshape(len(keypoints), -1)
+
+    return (
+        FRAME_HEADER.pack(sequence, len(keypoints), descriptors.shape[1])
+        + keypoints.tobytes()
+        + descriptors.tobytes()
+    )
+
+
+def decode_frame(payload):
+    """
+    Returns:
+        sequence number, Nx2 keypoints, NxD descriptors
+    """
+
+    sequence, n, dim = FRAME_HEADER.unpack_from(payload)
+
+    offset = FRAME_HEADER.size
+    expected = offset + FLOAT.itemsize * n * (2 + dim)
+
+    if len(payload) != expected:
+        raise ValueError(
+            f"Frame payload has {len(payload)} bytes, expected {expected}"
+        )
+
+    keypoints = np.frombuffer(payload, FLOAT, 2 * n, offset).reshape(n, 2)
+    offset += FLOAT.itemsize * 2 * n
+
+    descriptors = np.frombuffer(payload, FLOAT, n * dim, offset).reshape(n, dim)
+
+    return sequence, keypoints.astype(np.float64), descriptors.astype(np.float64)
+
+
+def encode_pose(frame_id, T):
+
+    T = np.asarray(T, dtype=FLOAT).reshape(4, 4)
+
+    return POSE_HEADER.pack(frame_id) + T.tobytes()
+
+
+def decode_pose(payload):
+    """
+    Returns:
+        frame id, 4x4 pose
+    """
+
+    (frame_id,) = POSE_HEADER.unpack_from(payload)
+
+    T = np.frombuffer(payload, FLOAT, 16, POSE_HEADER.size).reshape(4, 4)
+
+    return frame_id, T.astype(np.float64)
@@ -0,0 +1,477 @@
+import os
+import stat
+import time
+import signal
+import asyncio
+import multiprocessing
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from service.protocol import (
+    MSG_HELLO, MSG_FRAME, MSG_END, MSG_POSE, MSG_DONE, MSG_ERROR,
+    read_message, write_message,
+    encode_json, decode_json, decode_frame, encode_pose
+)
+
+
+# VisualOdometry arguments a client may set in its HELLO options
+VO_OPTIONS = (
+    "match_threshold", "max_iterations", "min_triangulation_angle", "rerank",
+    "frame_budget", "min_correspondences", "min_gn_iterations", "image_size"
+)
+
+# Initialization settings, same meaning as VisualOdometry.process_initialization
+INIT_OPTIONS = ("window", "min_inliers", "min_parallax")
+
+
+# -------------------------------------------------------
+# SESSION
+# -------------------------------------------------------
+
+class Session:
+    """
+    One client's VisualOdometry, fed frame by frame.
+
+    The first frames are buffered until the initialization window is
+    full. If no pair in the window can be initialized, the oldest frame
+    is dropped and the search is retried on the next frame; pose frame
+    ids stay relative to the client's first frame.
+
+    Sessions live in a worker (see open_session), so a frame step
+    crosses a process boundary once, not once per matching or pose
+    estimation call.
+    """
+
+    def __init__(self, session_id, K, options=None):
+
+        from vo.visual_odometry import VisualOdometry
+
+        options = dict(options or {})
+
+        unknown = set(options) - set(VO_OPTIONS) - {f"init_{k}" for k in INIT_OPTIONS}
+
+        if unknown:
+            raise ValueError(f"Unknown session options: {sorted(unknown)}")
+
+        self.session_id = session_id
+
+        self.init_options = {
+            key: options.pop(f"init_{key}")
+            for key in INIT_OPTIONS if f"init_{key}" in options
+        }
+        self.init_options.setdefault("window", 8)
+
+        self.vo = VisualOdometry(np.asarray(K, dtype=np.float64), **options)
+
+        self.pending = []       # frames buffered before initialization
+        self.frame_offset = 0   # frames dropped while searching for a pair
+        self.sent = 0           # poses already returned
+
+        self.frames = 0
+        self.processing_time = 0.0
+
+    def step(self, keypoints, descriptors):
+        """
+        Consumes one frame.
+
+        Returns:
+            list of (frame_id, pose) estimated since the last call
+        """
+
+        start = time.perf_counter()
+
+        if self.vo.initialized:
+            self.vo.process_frame(keypoints, descriptors)
+            self.vo.run_deferred()
+        else:
+            self.pending.append((keypoints, descriptors))
+
+            if len(self.pending) > self.init_options["window"]:
+                self.initialize()
+
+        self.frames += 1
+        self.processing_time += time.perf_counter() - start
+
+        return self.new_poses()
+
+    def finish(self):
+        """
+        Initializes from whatever is buffered if the stream ended early.
+        """
+
+        if not self.vo.initialized and len(self.pending) >= 2:
+            self.initialize()
+
+        return self.new_poses()
+
+    def initialize(self):
+
+        next_frame = self.vo.process_initialization(
+            self.pending,
+            num_workers=1,
+            **self.init_options
+        )
+
+        if next_frame is None:
+            self.pending.pop(0)
+            self.frame_offset += 1
+            return
+
+        for keypoints, descriptors in self.pending[next_frame:]:
+            self.vo.process_frame(keypoints, descriptors)
+            self.vo.run_deferred()
+
+        self.pending = []
+
+    def new_poses(self):
+
+        poses = self.vo.poses
+        frame_ids = poses.frame_ids
+
+        new = [
+            (int(frame_ids[k]) + self.frame_offset, poses[k])
+            for k in range(self.sent, len(poses))
+        ]
+
+        self.sent = len(poses)
+
+        return new
+
+    def summary(self):
+
+        return {
+            "session": self.session_id,
+            "frames": self.frames,
+            "poses": len(self.vo.poses),
+            "landmarks": len(self.vo.landmarks),
+            "processing_time": self.processing_time,
+            "degraded_frames": sum(
+                bool(report["degradations"]) for report in self.vo.frame_reports
+            )
+        }
+
+
+# -------------------------------------------------------
+# WORKERS
+# -------------------------------------------------------
+
+# Sessions of this process by id. The server process holds the sessions
+# run in its threads (workers=0), each worker process those assigned to it.
+_sessions = {}
+
+
+def open_session(session_id, K, options):
+    _sessions[session_id] = Session(session_id, K, options)
+
+
+def step_session(session_id, keypoints, descriptors):
+    return _sessions[session_id].step(keypoints, descriptors)
+
+
+def finish_session(session_id):
+    return _sessions[session_id].finish()
+
+
+def close_session(session_id):
+    """
+    Returns:
+        the session summary, or None if it was never opened
+    """
+
+    session = _sessions.pop(session_id, None)
+
+    if session is None:
+        return None
+
+    return session.summary()
+
+
+def init_worker():
+
+    # Worker processes are stopped by the server, not by Ctrl-C
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    # Pays the cv2 import before the first session, not during it
+    import vo.visual_odometry
+
+
+def worker_ready():
+    return True
+
+
+# -------------------------------------------------------
+# SERVER
+# -------------------------------------------------------
+
+class VOServer:
+    """
+    Asyncio server running one Session per connection on a Unix socket.
+
+    Each session lives in one of `workers` single-process executors,
+    the one with the fewest sessions when it connects, and steps there
+    one frame at a time. Only frames and poses cross the process
+    boundary, so throughput scales with sessions up to the number of
+    cores. With workers=0 sessions step in a thread pool of the server
+    process instead, which avoids the transfers but shares one GIL.
+
+    Backpressure: each session reads at most queue_size frames ahead of
+    the one being processed, and waits for the client to take its poses
+    (drain) before processing more. A slow client therefore only slows
+    its own socket; the workers are never held while waiting on it.
+    """
+
+    def __init__(self, path, workers=None, max_sessions=16, queue_size=4):
+
+        self.path = path
+
+        if workers is None:
+            # A single core gains nothing from processes but the transfers
+            cores = os.cpu_count() or 1
+            workers = cores if cores > 1 else 0
+
+        self.workers = workers
+        self.max_sessions = max_sessions
+        self.queue_size = queue_size
+
+        self.threads = None
+        self.processes = []          # one single-process executor per worker
+        self.process_sessions = []   # open sessions per worker
+        self.server = None
+        self.socket_inode = None   # of the socket file this server created
+
+        self.next_session_id = 0
+
+    async def start(self):
+
+        # A stale socket from an earlier run is replaced, any other file kept
+        if os.path.exists(self.path):
+
+            if not stat.S_ISSOCK(os.stat(self.path).st_mode):
+                raise FileExistsError(f"{self.path} exists and is not a socket")
+
+            os.unlink(self.path)
+
+        self.threads = ThreadPoolExecutor(max_workers=self.max_sessions)
+
+        # Forking a process that already runs threads is unsafe
+        context = multiprocessing.get_context("spawn")
+
+        self.processes = [
+            ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=context,
+                initializer=init_worker
+            )
+            for _ in range(self.workers)
+        ]
+        self.process_sessions = [0] * self.workers
+
+        # Spawns the workers now (executors start processes on first use)
+        await asyncio.gather(*[
+            asyncio.get_running_loop().run_in_executor(processes, worker_ready)
+            for processes in self.processes
+        ])
+
+        self.server = await asyncio.start_unix_server(self.handle_client, path=self.path)
+        self.socket_inode = os.stat(self.path).st_ino
+
+        print(f"VO service listening on {self.path} ({self.workers} workers)")
+
+    async def serve_forever(self):
+
+        await self.start()
+
+        try:
+            async with self.server:
+                await self.server.serve_forever()
+        finally:
+            self.close()
+
+    def close(self):
+
+        if self.server is not None:
+            self.server.close()
+
+        if self.threads is not None:
+            self.threads.shutdown(wait=False, cancel_futures=True)
+
+        for processes in self.processes:
+            processes.shutdown(wait=False, cancel_futures=True)
+
+        if self.socket_inode is not None:
+            self.remove_socket()
+
+    def remove_socket(self):
+        """
+        Removes the socket file, unless it was replaced since start().
+        """
+
+        inode = self.socket_inode
+        self.socket_inode = None
+
+        try:
+            info = os.stat(self.path)
+        except FileNotFoundError:
+            return
+
+        if stat.S_ISSOCK(info.st_mode) and info.st_ino == inode:
+            os.unlink(self.path)
+
+    async def handle_client(self, reader, writer):
+
+        session_id = self.next_session_id
+        self.next_session_id += 1
+
+        loop = asyncio.get_running_loop()
+
+        executor, worker = self.assign_worker()
+
+        try:
+            message = await read_message(reader)
+
+            if message is None:
+                return
+
+            msg_type, payload = message
+
+            if msg_type != MSG_HELLO:
+                raise ValueError("Expected HELLO as first message")
+
+            hello = decode_json(payload)
+
+            await loop.run_in_executor(
+                executor, open_session,
+                session_id, hello["K"], hello.get("options")
+            )
+
+            print(f"Session {session_id} started")
+
+            queue = asyncio.Queue(maxsize=self.queue_size)
+            receiver = asyncio.create_task(self.receive_frames(reader, queue))
+
+            try:
+                while True:
+
+                    frame = await queue.get()
+
+                    if frame is None:
+                        poses = await loop.run_in_executor(
+                            executor, finish_session, session_id
+                        )
+                    else:
+                        poses = await loop.run_in_executor(
+                            executor, step_session, session_id, *frame
+                        )
+
+                    for frame_id, T in poses:
+                        write_message(writer, MSG_POSE, encode_pose(frame_id, T))
+
+                    await writer.drain()
+
+                    if frame is None:
+                        break
+
+                # Surfaces protocol errors raised while reading
+                await receiver
+
+            finally:
+                receiver.cancel()
+
+            summary = await loop.run_in_executor(executor, close_session, session_id)
+            write_message(writer, MSG_DONE, encode_json(summary))
+            await writer.drain()
+
+            print(
+                f"Session {session_id} done: {summary['frames']} frames, "
+                f"{summary['poses']} poses in {summary['processing_time']:.2f} s"
+            )
+
+        except (ConnectionError, asyncio.IncompleteReadError):
+            print(f"Session {session_id} disconnected")
+
+        except Exception as e:
+            print(f"Session {session_id} failed: {e}")
+
+            try:
+                write_message(writer, MSG_ERROR, str(e).encode("utf-8"))
+                await writer.drain()
+            except ConnectionError:
+                pass
+
+        finally:
+            writer.close()
+            self.release_worker(worker, session_id)
+
+    def assign_worker(self):
+        """
+        Returns:
+            executor of a new session, worker index (None for threads)
+        """
+
+        if not self.processes:
+            return self.threads, None
+
+        worker = self.process_sessions.index(min(self.process_sessions))
+        self.process_sessions[worker] += 1
+
+        return self.processes[worker], worker
+
+    def release_worker(self, worker, session_id):
+
+        executor = self.threads if worker is None else self.processes[worker]
+
+        # Drops the session if it did not finish; a no-op otherwise
+        try:
+            executor.submit(close_session, session_id)
+        except RuntimeError:
+            pass   # executor already shut down
+
+        if worker is not None:
+            self.process_sessions[worker] -= 1
+
+    async def receive_frames(self, reader, queue):
+        """
+        Decodes incoming frames into the session queue; blocks on a full
+        queue, which stops reading the socket.
+        """
+
+        try:
+            while True:
+
+                message = await read_message(reader)
+
+                if message is None:
+                    raise ConnectionError("Stream closed before END")
+
+                msg_type, payload = message
+
+                if msg_type == MSG_END:
+                    await queue.put(None)
+                    return
+
+                if msg_type != MSG_FRAME:
+                    raise ValueError(f"Unexpected message type {msg_type}")
+
+                _, keypoints, descriptors = decode_frame(payload)
+
+                await queue.put((keypoints, descriptors))
+
+        except Exception:
+            # Lets the session finish; the error surfaces when it awaits us
+            await queue.put(None)
+            raise
+
+
+def run_server(path, workers=None, max_sessions=16, queue_size=4):
+
+    server = VOServer(
+        path,
+        workers=workers,
+        max_sessions=max_sessions,
+        queue_size=queue_size
+    )
+
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        print("VO service stopped")
@@ -11,15 +11,94 @@ def compute_l2_distance_matrix(desc1: np.ndarray, desc2: np.ndarray) -> np.ndarr
     Returns:
         NxM distance matrix
     """
+    desc1 = np.asarray(desc1, dtype=np.float64)
+    desc2 = np.asarray(desc2, dtype=np.float64)
+
     dists = np.linalg.norm(desc1[:, None, :] - desc2[None, :, :], axis=2)
     return dists
 
 
+def matches_from_distance_matrix(
+    dists: np.ndarray,
+    distance_threshold: float = 0.5,
+    mutual_check: bool = True
+):
+    """
+    Nearest neighbor matches from an NxM distance matrix.
+
+    Returns:
+        List of (row_index, column_index)
+    """
+
+    if dists.size == 0:
+        return []
+
+    rows = np.arange(dists.shape[0])
+
+    # Nearest neighbor from desc1 → desc2
+    nn12 = np.argmin(dists, axis=1)
+    valid = dists[rows, nn12] < distance_threshold
+
+    if mutual_check:
+        # Nearest neighbor from desc2 → desc1
+        nn21 = np.argmin(dists, axis=0)
+        valid &= nn21[nn12] == rows
+
+    idx = rows[valid]
+
+    return list(zip(idx.tolist(), nn12[idx].tolist()))
+
+
+def compute_pq_distance_matrix(
+    desc1: np.ndarray,
+    desc2: np.ndarray,
+    codes2: np.ndarray,
+    pq,
+    rerank: int = 4
+) -> np.ndarray:
+    """
+    Approximate distance matrix from product-quantized descriptors.
+
+    Distances are looked up from the PQ tables of desc1 against codes2.
+    The rerank nearest candidates of each row are then recomputed
+    exactly from desc2.
+
+    desc1: NxD full-precision queries
+    desc2: MxD stored descriptors (any float dtype), used for re-ranking
+    codes2: MxS PQ codes of desc2
+    pq: ProductQuantizer
+
+    Returns:
+        NxM distance matrix
+    """
+
+    desc1 = np.asarray(desc1, dtype=np.float64)
+
+    dists = np.sqrt(pq.asymmetric_distances(desc1, codes2))
+
+    rerank = min(rerank, dists.shape[1])
+
+    if rerank == 0:
+        return dists
+
+    rows = np.arange(dists.shape[0])[:, None]
+
+    top = np.argpartition(dists, rerank - 1, axis=1)[:, :rerank]
+
+    candidates = np.asarray(desc2, dtype=np.float64)[top]
+    dists[rows, top] = np.linalg.norm(candidates - desc1[:, None, :], axis=2)
+
+    return dists
+
+
 def match_descriptors(
     desc1: np.ndarray,
     desc2: np.ndarray,
     distance_threshold: float = 0.5,
-    mutual_check: bool = True
+    mutual_check: bool = True,
+    pq=None,
+    codes2: np.ndarray = None,
+    rerank: int = 4
 ):
     """
     Matches descriptors using nearest neighbor search.
@@ -27,29 +106,66 @@ def match_descriptors(
     desc1: NxD
     desc2: MxD
 
+    If a ProductQuantizer pq is given, distances come from its lookup
+    tables (codes2 are the PQ codes of desc2, computed if omitted) and
+    only the rerank best candidates per row are verified exactly.
+
     Returns:
         List of (index_in_desc1, index_in_desc2)
     """
 
-    dists = compute_l2_distance_matrix(desc1, desc2)
+    if pq is None:
+        dists = compute_l2_distance_matrix(desc1, desc2)
+    else:
+        if codes2 is None:
+            codes2 = pq.encode(desc2)
 
-    matches = []
+        dists = compute_pq_distance_matrix(desc1, desc2, codes2, pq, rerank)
 
-    # Nearest neighbor from desc1 → desc2
-    nn12 = np.argmin(dists, axis=1)
-    min_dist12 = np.min(dists, axis=1)
+    return matches_from_distance_matrix(dists, distance_threshold, mutual_check)
 
-    if mutual_check:
-        # Nearest neighbor from desc2 → desc1
-        nn21 = np.argmin(dists, axis=0)
 
-        for i, j in enumerate(nn12):
-            if min_dist12[i] < distance_threshold:
-                if nn21[j] == i:
-                    matches.append((i, j))
-    else:
-        for i, j in enumerate(nn12):
-            if min_dist12[i] < distance_threshold:
-                matches.append((i, j))
+def bucket_subsample(
+    points_2d: np.ndarray,
+    max_points: int,
+    width: float,
+    height: float,
+    grid=(8, 6)
+) -> np.ndarray:
+    """
+    Selects at most max_points points spread evenly over the image.
+
+    The image is divided into grid (columns, rows) buckets, and points
+    are taken round-robin across buckets: every non-empty bucket gives
+    its first point, then its second, and so on. Within a bucket the
+    input order is kept.
+
+    points_2d: Nx2 image coordinates
+
+    Returns:
+        sorted indices of the selected points
+    """
+
+    n = len(points_2d)
+
+    if n <= max_points:
+        return np.arange(n)
+
+    cols, rows = grid
+
+    col = np.clip((points_2d[:, 0] * cols / width).astype(np.int64), 0, cols - 1)
+    row = np.clip((points_2d[:, 1] * rows / height).astype(np.int64), 0, rows - 1)
+    bucket = row * cols + col
+
+    # Rank of every point within its bucket
+    order = np.argsort(bucket, kind="stable")
+    sorted_buckets = bucket[order]
+    starts = np.flatnonzero(np.r_[True, sorted_buckets[1:] != sorted_buckets[:-1]])
+    counts = np.diff(np.r_[starts, n])
+
+    rank = np.empty(n, dtype=np.int64)
+    rank[order] = np.arange(n) - np.repeat(starts, counts)
+
+    selected = np.lexsort((bucket, rank))[:max_points]
 
-    return matches
+    return np.sort(selected)
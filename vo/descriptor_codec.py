@@ -0,0 +1,234 @@
+import numpy as np
+
+
+# -------------------------------------------------------
+# K-MEANS
+# -------------------------------------------------------
+
+def kmeans(data, k, iterations=20, seed=0):
+    """
+    Lloyd's k-means with k-means++ seeding.
+
+    data: NxD
+    Returns:
+        centroids: kxD (k is clipped to N)
+        labels: N
+    """
+
+    rng = np.random.default_rng(seed)
+
+    data = np.asarray(data, dtype=np.float64)
+    n = len(data)
+    k = min(k, n)
+
+    centroids = np.empty((k, data.shape[1]))
+    centroids[0] = data[rng.integers(n)]
+
+    closest = np.sum((data - centroids[0]) ** 2, axis=1)
+
+    for i in range(1, k):
+
+        total = closest.sum()
+
+        if total <= 0:
+            idx = rng.integers(n)
+        else:
+            idx = rng.choice(n, p=closest / total)
+
+        centroids[i] = data[idx]
+        closest = np.minimum(closest, np.sum((data - centroids[i]) ** 2, axis=1))
+
+    labels = np.zeros(n, dtype=np.int64)
+
+    for _ in range(iterations):
+
+        dists = squared_distance_matrix(data, centroids)
+        new_labels = np.argmin(dists, axis=1)
+
+        counts = np.bincount(new_labels, minlength=k)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, new_labels, data)
+
+        nonempty = counts > 0
+        centroids[nonempty] = sums[nonempty] / counts[nonempty, None]
+
+        if np.array_equal(new_labels, labels):
+            break
+
+        labels = new_labels
+
+    return centroids, labels
+
+
+def squared_distance_matrix(a, b):
+    """
+    Pairwise squared L2 distances between the rows of a (NxD) and b (MxD).
+    """
+    d = (
+        np.sum(a ** 2, axis=1)[:, None]
+        + np.sum(b ** 2, axis=1)[None, :]
+        - 2.0 * a @ b.T
+    )
+    return np.maximum(d, 0.0)
+
+
+# -------------------------------------------------------
+# SCALAR QUANTIZATION (storage)
+# -------------------------------------------------------
+
+class ScalarQuantizer:
+    """
+    Per-component quantization of descriptors for storage.
+
+    dtype "float16" halves the precision (4x smaller than float64),
+    dtype "int8" maps [-max_abs, max_abs] linearly to [-127, 127]
+    (8x smaller).
+    """
+
+    def __init__(self, dtype="float16", max_abs=1.0):
+
+        if dtype not in ("float16", "int8"):
+            raise ValueError(f"Unsupported descriptor dtype: {dtype}")
+
+        self.dtype = dtype
+        self.max_abs = max_abs
+
+    def fit(self, descriptors):
+
+        self.max_abs = float(np.max(np.abs(descriptors)))
+
+        return self
+
+    def encode(self, descriptors):
+
+        if self.dtype == "float16":
+            return np.asarray(descriptors, dtype=np.float16)
+
+        scaled = np.round(np.asarray(descriptors) * (127.0 / self.max_abs))
+
+        return np.clip(scaled, -127, 127).astype(np.int8)
+
+    def decode(self, codes):
+
+        if self.dtype == "float16":
+            return codes.astype(np.float32)
+
+        return codes.astype(np.float32) * np.float32(self.max_abs / 127.0)
+
+
+# -------------------------------------------------------
+# PRODUCT QUANTIZATION (matching)
+# -------------------------------------------------------
+
+class ProductQuantizer:
+    """
+    Splits D-dimensional descriptors into num_subspaces chunks and
+    encodes each chunk as the index of its nearest centroid, giving
+    num_subspaces uint8 codes per descriptor.
+
+    Distances from full-precision queries to encoded descriptors are
+    computed asymmetrically: one lookup table of query-to-centroid
+    distances per subspace, then a sum of table lookups per code.
+    """
+
+    def __init__(self, num_subspaces=5, num_centroids=256):
+
+        if num_centroids > 256:
+            raise ValueError("At most 256 centroids fit in a uint8 code")
+
+        self.num_subspaces = num_subspaces
+        self.num_centroids = num_centroids
+
+        self.codebooks = None   # list of (num_centroids x sub_dim)
+        self.bounds = None      # subspace column boundaries
+
+    def fit(self, descriptors, iterations=20, seed=0):
+
+        descriptors = np.asarray(descriptors, dtype=np.float64)
+
+        dim = descriptors.shape[1]
+
+        if dim < self.num_subspaces:
+            raise ValueError("More subspaces than descriptor dimensions")
+
+        self.bounds = np.linspace(0, dim, self.num_subspaces + 1).astype(int)
+
+        self.codebooks = []
+
+        for m in range(self.num_subspaces):
+
+            sub = descriptors[:, self.bounds[m]:self.bounds[m + 1]]
+
+            centroids, _ = kmeans(
+                sub, self.num_centroids,
+                iterations=iterations,
+                seed=seed + m
+            )
+
+            self.codebooks.append(centroids)
+
+        return self
+
+    def encode(self, descriptors):
+        """
+        Returns:
+            NxM uint8 codes
+        """
+
+        descriptors = np.asarray(descriptors, dtype=np.float64)
+
+        codes = np.empty((len(descriptors), self.num_subspaces), dtype=np.uint8)
+
+        for m, centroids in enumerate(self.codebooks):
+
+            sub = descriptors[:, self.bounds[m]:self.bounds[m + 1]]
+            codes[:, m] = np.argmin(squared_distance_matrix(sub, centroids), axis=1)
+
+        return codes
+
+    def decode(self, codes):
+
+        return np.hstack([
+            centroids[codes[:, m]]
+            for m, centroids in enumerate(self.codebooks)
+        ])
+
+    def distance_tables(self, queries):
+        """
+        Squared distances from each query chunk to every centroid.
+
+        queries: QxD
+        Returns:
+            QxMxC lookup tables
+        """
+
+        queries = np.asarray(queries, dtype=np.float64)
+
+        tables = np.zeros((len(queries), self.num_subspaces, self.num_centroids))
+
+        for m, centroids in enumerate(self.codebooks):
+
+            sub = queries[:, self.bounds[m]:self.bounds[m + 1]]
+            tables[:, m, :len(centroids)] = squared_distance_matrix(sub, centroids)
+
+        return tables
+
+    def asymmetric_distances(self, queries, codes):
+        """
+        Approximate squared distances between queries and encoded descriptors.
+
+        queries: QxD full-precision descriptors
+        codes: NxM codes from encode
+
+        Returns:
+            QxN matrix
+        """
+
+        tables = self.distance_tables(queries)
+
+        dists = np.zeros((len(tables), len(codes)))
+
+        for m in range(self.num_subspaces):
+            dists += tables[:, m, codes[:, m]]
+
+        return dists
@@ -1,5 +1,10 @@
 import numpy as np
 import cv2
+from concurrent.futures import ThreadPoolExecutor
+
+from vo.data_association import match_descriptors
+from geometry.se3 import transform_points
+from geometry.projection import project_points
 
 
 def normalize_points(K, pts):
@@ -28,6 +33,10 @@ def estimate_essential_matrix(K, pts1, pts2):
         threshold=1.0
     )
 
+    # Degenerate configurations can return several stacked solutions
+    if E is not None and E.shape[0] > 3:
+        E = E[:3]
+
     return E, mask
 
 
@@ -80,3 +89,169 @@ def initialize_two_view(K, pts0, pts1):
     points_3d = triangulate_points(K, T0, T1, pts0, pts1)
 
     return T0, T1, points_3d
+
+
+# -------------------------------------------------------
+# INITIALIZATION PAIR SELECTION
+# -------------------------------------------------------
+
+def evaluate_initialization_candidate(
+    K, kpts0, desc0, kpts1, desc1,
+    match_threshold=0.5,
+    max_reprojection_error=2.0
+):
+    """
+    Runs two-view initialization on a frame pair and measures its quality.
+
+    Returns:
+        dict with the two-view solution (T0, T1, points_3d, matches),
+        the inlier mask and the quality measures num_inliers,
+        parallax (median, degrees) and reprojection_error (median, pixels),
+        or None if the pair cannot be initialized.
+    """
+
+    matches = match_descriptors(
+        desc0, desc1,
+        distance_threshold=match_threshold
+    )
+
+    if len(matches) < 8:
+        return None
+
+    pts0 = np.array([kpts0[i] for i, _ in matches])
+    pts1 = np.array([kpts1[j] for _, j in matches])
+
+    try:
+        T0, T1, points_3d = initialize_two_view(K, pts0, pts1)
+    except cv2.error:
+        return None
+
+    X_c0 = transform_points(T0, points_3d)
+    X_c1 = transform_points(T1, points_3d)
+
+    in_front = (X_c0[:, 2] > 0) & (X_c1[:, 2] > 0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        err0 = np.linalg.norm(project_points(K, X_c0) - pts0, axis=1)
+        err1 = np.linalg.norm(project_points(K, X_c1) - pts1, axis=1)
+
+    reprojection_error = np.maximum(err0, err1)
+
+    inliers = in_front & (reprojection_error < max_reprojection_error)
+
+    if not np.any(inliers):
+        return None
+
+    # Angle between the two viewing rays of each point
+    c0 = -T0[:3, :3].T @ T0[:3, 3]
+    c1 = -T1[:3, :3].T @ T1[:3, 3]
+
+    r0 = points_3d - c0
+    r1 = points_3d - c1
+
+    cos_angle = np.sum(r0 * r1, axis=1) / (
+        np.linalg.norm(r0, axis=1) * np.linalg.norm(r1, axis=1)
+    )
+    parallax = np.degrees(np.arccos(np.clip(cos_angle, -1.0, 1.0)))
+
+    return {
+        "T0": T0,
+        "T1": T1,
+        "points_3d": points_3d,
+        "matches": matches,
+        "inliers": inliers,
+        "num_inliers": int(np.sum(inliers)),
+        "parallax": float(np.median(parallax[inliers])),
+        "reprojection_error": float(np.median(reprojection_error[inliers]))
+    }
+
+
+def initialization_score(candidate, min_parallax):
+    """
+    Inlier count, discounted for low parallax and reprojection error.
+    """
+
+    parallax_factor = min(candidate["parallax"] / min_parallax, 1.0)
+
+    return (
+        candidate["num_inliers"] * parallax_factor
+        / (1.0 + candidate["reprojection_error"])
+    )
+
+
+def passes_quality_bar(candidate, min_inliers, min_parallax):
+
+    return (
+        candidate["num_inliers"] >= min_inliers
+        and candidate["parallax"] >= min_parallax
+    )
+
+
+def select_initialization_pair(
+    K, frames,
+    window=8,
+    num_workers=4,
+    min_inliers=50,
+    min_parallax=3.0,
+    match_threshold=0.5,
+    max_reprojection_error=2.0
+):
+    """
+    Searches the pairs (0, k), k = 1..window, for the best bootstrap.
+
+    Candidates are evaluated in parallel, num_workers at a time, in
+    increasing k. The search stops after the first batch in which a
+    candidate passes the quality bar (min_inliers, min_parallax).
+
+    frames: list of (keypoints, descriptors)
+
+    Returns:
+        best candidate (see evaluate_initialization_candidate) with its
+        frame index stored under "frame_index", or None.
+    """
+
+    last = min(window, len(frames) - 1)
+
+    kpts0, desc0 = frames[0]
+
+    candidates = []
+
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+
+        for start in range(1, last + 1, num_workers):
+
+            indices = range(start, min(start + num_workers, last + 1))
+
+            futures = [
+                (k, executor.submit(
+                    evaluate_initialization_candidate,
+                    K, kpts0, desc0, frames[k][0], frames[k][1],
+                    match_threshold, max_reprojection_error
+                ))
+                for k in indices
+            ]
+
+            for k, future in futures:
+
+                candidate = future.result()
+
+                if candidate is not None:
+                    candidate["frame_index"] = k
+                    candidates.append(candidate)
+
+            if any(
+                passes_quality_bar(c, min_inliers, min_parallax)
+                for c in candidates
+            ):
+                break
+
+    if len(candidates) == 0:
+        return None
+
+    return max(
+        candidates,
+        key=lambda c: (
+            passes_quality_bar(c, min_inliers, min_parallax),
+            initialization_score(c, min_parallax)
+        )
+    )
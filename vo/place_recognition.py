@@ -0,0 +1,306 @@
+import numpy as np
+from collections import defaultdict
+
+from vo.descriptor_codec import kmeans
+from vo.data_association import match_descriptors
+from vo.initialization import estimate_essential_matrix
+
+
+# -------------------------------------------------------
+# VOCABULARY
+# -------------------------------------------------------
+
+class Vocabulary:
+    """
+    Hierarchical k-means tree over descriptors.
+
+    Every internal node has up to `branching` children, and the leaves
+    at depth `depth` are the visual words. A descriptor is quantized by
+    descending from the root, comparing it only with the children of
+    the current node (O(branching * depth) per descriptor).
+
+    Word weights are inverse document frequencies over the training
+    frames.
+    """
+
+    def __init__(self, branching=8, depth=3):
+
+        self.branching = branching
+        self.depth = depth
+
+        self.child_centroids = None   # internal nodes x branching x D
+        self.children = None          # internal nodes x branching, -1 if absent
+        self.word_of_node = None      # node -> word id (-1 for internal nodes)
+        self.idf = None               # word -> weight
+
+        self.num_words = 0
+
+    def train(self, frame_descriptors, iterations=10, seed=0):
+        """
+        frame_descriptors: list of NxD descriptor arrays, one per frame
+        """
+
+        data = np.vstack(frame_descriptors).astype(np.float64)
+        dim = data.shape[1]
+
+        child_centroids = []
+        children = []
+        is_leaf = [False]
+
+        # (node, member indices, level)
+        stack = [(0, np.arange(len(data)), 0)]
+
+        child_centroids.append(None)
+        children.append(None)
+
+        while stack:
+
+            node, members, level = stack.pop()
+
+            centroids, labels = kmeans(
+                data[members], self.branching,
+                iterations=iterations,
+                seed=seed + node
+            )
+
+            node_centroids = np.full((self.branching, dim), np.inf)
+            node_children = np.full(self.branching, -1, dtype=np.int64)
+
+            for c in range(len(centroids)):
+
+                child_members = members[labels == c]
+
+                if len(child_members) == 0:
+                    continue
+
+                child = len(is_leaf)
+
+                node_centroids[c] = centroids[c]
+                node_children[c] = child
+
+                leaf = (
+                    level + 1 == self.depth
+                    or len(child_members) <= self.branching
+                )
+
+                is_leaf.append(leaf)
+                child_centroids.append(None)
+                children.append(None)
+
+                if not leaf:
+                    stack.append((child, child_members, level + 1))
+
+            child_centroids[node] = node_centroids
+            children[node] = node_children
+
+        # Leaves have no children: pad them so every level is indexable
+        padding_centroids = np.full((self.branching, dim), np.inf)
+        padding_children = np.full(self.branching, -1, dtype=np.int64)
+
+        self.child_centroids = np.array([
+            padding_centroids if c is None else c for c in child_centroids
+        ])
+        self.children = np.array([
+            padding_children if c is None else c for c in children
+        ])
+
+        is_leaf = np.array(is_leaf)
+
+        self.word_of_node = np.full(len(is_leaf), -1, dtype=np.int64)
+        self.word_of_node[is_leaf] = np.arange(np.sum(is_leaf))
+        self.num_words = int(np.sum(is_leaf))
+
+        # Inverse document frequency over the training frames
+        document_frequency = np.zeros(self.num_words)
+
+        for descriptors in frame_descriptors:
+            words = np.unique(self.quantize(descriptors))
+            document_frequency[words] += 1
+
+        self.idf = np.log(
+            len(frame_descriptors) / np.maximum(document_frequency, 1.0)
+        )
+
+        return self
+
+    def quantize(self, descriptors):
+        """
+        Returns:
+            word id of each descriptor (N,)
+        """
+
+        descriptors = np.asarray(descriptors, dtype=np.float64)
+
+        nodes = np.zeros(len(descriptors), dtype=np.int64)
+        words = self.word_of_node[nodes]
+
+        for _ in range(self.depth):
+
+            active = words < 0
+
+            if not np.any(active):
+                break
+
+            centroids = self.child_centroids[nodes[active]]
+            d = np.sum((centroids - descriptors[active, None, :]) ** 2, axis=2)
+
+            choice = np.argmin(d, axis=1)
+            nodes[active] = self.children[nodes[active], choice]
+
+            words = self.word_of_node[nodes]
+
+        return words
+
+    def bow_vector(self, descriptors):
+        """
+        L1-normalized TF-IDF bag-of-words vector.
+
+        Returns:
+            dict {word_id: weight}
+        """
+
+        words = self.quantize(descriptors)
+
+        if len(words) == 0:
+            return {}
+
+        unique, counts = np.unique(words, return_counts=True)
+
+        weights = counts / len(words) * self.idf[unique]
+
+        total = np.sum(np.abs(weights))
+
+        if total <= 0:
+            return {}
+
+        return dict(zip(unique.tolist(), (weights / total).tolist()))
+
+
+# -------------------------------------------------------
+# KEYFRAME DATABASE
+# -------------------------------------------------------
+
+class KeyframeDatabase:
+    """
+    Keyframes indexed by visual word for place recognition.
+
+    The inverted index maps each word to the keyframes containing it,
+    so a query only touches keyframes that share at least one word
+    with it. Candidates are ranked by the L1 score between TF-IDF
+    vectors, and only the best few are verified geometrically.
+    """
+
+    def __init__(self, vocabulary):
+
+        self.vocabulary = vocabulary
+
+        self.inverted_index = defaultdict(list)   # word -> [(keyframe_id, weight)]
+        self.keyframes = {}                       # keyframe_id -> (keypoints, descriptors)
+
+    def __len__(self):
+        return len(self.keyframes)
+
+    def add_keyframe(self, keyframe_id, keypoints, descriptors):
+
+        bow = self.vocabulary.bow_vector(descriptors)
+
+        for word, weight in bow.items():
+            self.inverted_index[word].append((keyframe_id, weight))
+
+        self.keyframes[keyframe_id] = (keypoints, descriptors)
+
+    def query(self, descriptors, top_k=5, max_keyframe_id=None):
+        """
+        Ranks stored keyframes by similarity to a set of descriptors.
+
+        max_keyframe_id: if given, only keyframes with id <= this value
+                         are considered (to skip the recent past)
+
+        Returns:
+            list of (keyframe_id, score), best first, score in [0, 1]
+        """
+
+        bow = self.vocabulary.bow_vector(descriptors)
+
+        scores = defaultdict(float)
+
+        for word, q in bow.items():
+
+            for keyframe_id, w in self.inverted_index.get(word, ()):
+
+                if max_keyframe_id is not None and keyframe_id > max_keyframe_id:
+                    continue
+
+                # L1 score restricted to shared words
+                scores[keyframe_id] += abs(q) + abs(w) - abs(q - w)
+
+        ranked = sorted(scores.items(), key=lambda item: -item[1])
+
+        return [(keyframe_id, 0.5 * s) for keyframe_id, s in ranked[:top_k]]
+
+    def verify(
+        self, K, keyframe_id, keypoints, descriptors,
+        match_threshold=0.5
+    ):
+        """
+        Counts the matches consistent with an essential matrix between
+        a stored keyframe and the query.
+        """
+
+        kf_keypoints, kf_descriptors = self.keyframes[keyframe_id]
+
+        matches = match_descriptors(
+            kf_descriptors, descriptors,
+            distance_threshold=match_threshold
+        )
+
+        if len(matches) < 8:
+            return 0
+
+        pts0 = np.array([kf_keypoints[i] for i, _ in matches])
+        pts1 = np.array([keypoints[j] for _, j in matches])
+
+        E, mask = estimate_essential_matrix(K, pts0, pts1)
+
+        if E is None or mask is None:
+            return 0
+
+        return int(np.sum(mask))
+
+    def detect_loop(
+        self, K, keypoints, descriptors,
+        max_keyframe_id,
+        top_k=3,
+        min_score=0.05,
+        min_inliers=30,
+        match_threshold=0.5
+    ):
+        """
+        Looks for a past keyframe showing the same place.
+
+        Only the top_k candidates retrieved from the inverted index are
+        verified geometrically.
+
+        Returns:
+            (keyframe_id, score, inliers) of the best verified candidate,
+            or None
+        """
+
+        best = None
+
+        for keyframe_id, score in self.query(
+            descriptors, top_k=top_k, max_keyframe_id=max_keyframe_id
+        ):
+
+            if score < min_score:
+                break
+
+            inliers = self.verify(
+                K, keyframe_id, keypoints, descriptors,
+                match_threshold=match_threshold
+            )
+
+            if inliers >= min_inliers and (best is None or inliers > best[2]):
+                best = (keyframe_id, score, inliers)
+
+        return best
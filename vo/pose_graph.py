@@ -0,0 +1,452 @@
+import numpy as np
+
+from geometry.se3 import skew_batch, so3_log_batch, so3_right_jacobian_inverse_batch
+from geometry.sim3 import sim3_scale_batch, sim3_inverse_batch, sim3_retract_batch
+
+
+# Information of the two edge types built by the VO pipeline, ordered
+# as [translation, rotation, log scale]. Tracking gives good rotations
+# and relative scale but its translation is in drifting map units;
+# odometry gives metric translation and no scale information.
+TRACKING_INFORMATION = np.array([1.0, 1.0, 1.0, 1e3, 1e3, 1e3, 1e2])
+ODOMETRY_INFORMATION = np.array([1e2, 1e2, 1e2, 1e1, 1e1, 1e1, 0.0])
+
+
+class PoseGraph:
+    """
+    Pose graph over Sim(3) or SE(3) nodes, solved with sparse
+    Levenberg-Marquardt.
+
+    Nodes are 4x4 transforms X_i = [s_i R_i | t_i]. An edge (i, j)
+    measures Z_ij ~ X_i^-1 X_j. Its 7D residual is
+    [translation, rotation vector, log scale] of Z_ij^-1 X_i^-1 X_j.
+
+    Metric edges (e.g. wheel odometry) measure the relative motion in
+    world units, R_i^T (t_j - t_i), instead of node i's scaled units,
+    and carry no information on the relative scale.
+
+    With similarity=False node scales stay fixed at 1 (6 DoF per node).
+    """
+
+    def __init__(self, similarity=True):
+
+        self.similarity = similarity
+        self.dof = 7 if similarity else 6
+
+        self.nodes = []
+        self.fixed = []
+
+        self.edges_i = []
+        self.edges_j = []
+        self.measurements = []
+        self.informations = []
+        self.metric = []
+
+        self._edge_arrays = None
+        self._structure = None
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def add_node(self, X, fixed=False):
+        """
+        Returns:
+            node index
+        """
+
+        self.nodes.append(np.array(X, dtype=np.float64))
+        self.fixed.append(fixed)
+
+        self._structure = None
+
+        return len(self.nodes) - 1
+
+    def add_edge(self, i, j, Z, information=None, metric=False):
+        """
+        information: 7x7 matrix, 7-vector diagonal or None (identity),
+                     ordered as [translation, rotation, scale]
+        """
+
+        if information is None:
+            information = np.eye(7)
+        else:
+            information = np.asarray(information, dtype=np.float64)
+
+            if information.ndim == 1:
+                information = np.diag(information)
+
+        if metric:
+            information = information.copy()
+            information[6, :] = 0.0
+            information[:, 6] = 0.0
+
+        self.edges_i.append(i)
+        self.edges_j.append(j)
+        self.measurements.append(np.array(Z, dtype=np.float64))
+        self.informations.append(information)
+        self.metric.append(metric)
+
+        self._edge_arrays = None
+        self._structure = None
+
+    def edge_arrays(self):
+        """
+        Edges stacked into arrays (cached until the next add_edge).
+
+        Returns:
+            i, j, measurements (Ex4x4), informations (Ex7x7), metric flags
+        """
+
+        if self._edge_arrays is None:
+            self._edge_arrays = (
+                np.array(self.edges_i, dtype=np.int64),
+                np.array(self.edges_j, dtype=np.int64),
+                np.array(self.measurements),
+                np.array(self.informations),
+                np.array(self.metric, dtype=bool)
+            )
+
+        return self._edge_arrays
+
+    # -------------------------------------------------------
+    # RESIDUALS AND JACOBIANS
+    # -------------------------------------------------------
+
+    def linearize(self, X, jacobians=True):
+        """
+        Residuals and Jacobians of all edges at node estimates X.
+
+        Returns:
+            r: Ex7 residuals
+            J_i, J_j: Ex7x7 Jacobians wrt the [rho, omega, sigma]
+                      updates of nodes i and j
+        """
+
+        i, j, Z, _, metric = self.edge_arrays()
+
+        s = sim3_scale_batch(X)
+
+        s_i = s[i]
+        s_j = s[j]
+        R_i = X[i, :3, :3] / s_i[:, None, None]
+        R_j = X[j, :3, :3] / s_j[:, None, None]
+
+        s_Z = sim3_scale_batch(Z)
+        R_Z_T = np.swapaxes(Z[:, :3, :3], 1, 2) / s_Z[:, None, None]
+
+        R_i_T = np.swapaxes(R_i, 1, 2)
+        R_ij = R_i_T @ R_j
+
+        # Relative translation in node i's units (world units if metric)
+        c_i = np.where(metric, 1.0, s_i)
+        t_ij = np.einsum("nij,nj->ni", R_i_T, X[j, :3, 3] - X[i, :3, 3]) / c_i[:, None]
+
+        A = R_Z_T / s_Z[:, None, None]
+
+        r = np.zeros((len(i), 7))
+        r[:, :3] = np.einsum("nij,nj->ni", A, t_ij - Z[:, :3, 3])
+        r[:, 3:6] = so3_log_batch(R_Z_T @ R_ij)
+        r[:, 6] = np.where(metric, 0.0, np.log(s_j / s_i / s_Z))
+
+        if not jacobians:
+            return r, None, None
+
+        J_i = np.zeros((len(i), 7, 7))
+        J_j = np.zeros((len(i), 7, 7))
+
+        J_i[:, :3, :3] = -A * (s_i / c_i)[:, None, None]
+        J_i[:, :3, 3:6] = A @ skew_batch(t_ij)
+        J_i[:, :3, 6] = np.where(
+            metric[:, None], 0.0, -np.einsum("nij,nj->ni", A, t_ij)
+        )
+        Jr_inv = so3_right_jacobian_inverse_batch(r[:, 3:6])
+
+        J_i[:, 3:6, 3:6] = -Jr_inv @ np.swapaxes(R_ij, 1, 2)
+        J_i[:, 6, 6] = np.where(metric, 0.0, -1.0)
+
+        J_j[:, :3, :3] = A @ R_ij * (s_j / c_i)[:, None, None]
+        J_j[:, 3:6, 3:6] = Jr_inv
+        J_j[:, 6, 6] = np.where(metric, 0.0, 1.0)
+
+        return r, J_i, J_j
+
+    def cost(self, X):
+
+        r, _, _ = self.linearize(X, jacobians=False)
+        Omega = self.edge_arrays()[3]
+
+        return float(np.einsum("ni,nij,nj->", r, Omega, r))
+
+    def sparsity_structure(self):
+        """
+        Sparsity pattern of the normal equations over the free nodes,
+        computed once per optimization.
+
+        Returns:
+            dict with the free nodes, the per-edge column offsets, the
+            map from block entries to stored entries and the CSR
+            (= CSC, H being symmetric) index arrays
+        """
+
+        if self._structure is not None:
+            return self._structure
+
+        d = self.dof
+
+        i, j, _, _, _ = self.edge_arrays()
+
+        free = np.flatnonzero(~np.array(self.fixed))
+
+        # Column offset of each free node, -1 for fixed nodes
+        offset = np.full(len(self.nodes), -1)
+        offset[free] = np.arange(len(free)) * d
+
+        n = len(free) * d
+
+        a, c = np.meshgrid(np.arange(d), np.arange(d), indexing="ij")
+
+        keeps = []
+        rows = []
+        cols = []
+
+        for node_r, node_c in ((i, i), (i, j), (j, i), (j, j)):
+
+            keep = (offset[node_r] >= 0) & (offset[node_c] >= 0)
+
+            keeps.append(keep)
+            rows.append((offset[node_r[keep], None, None] + a).ravel())
+            cols.append((offset[node_c[keep], None, None] + c).ravel())
+
+        # Explicit diagonal, so damping always has an entry to go to
+        rows.append(np.arange(n))
+        cols.append(np.arange(n))
+
+        keys = np.concatenate(rows) * n + np.concatenate(cols)
+
+        unique, inverse = np.unique(keys, return_inverse=True)
+
+        row_of = unique // n
+        indices = unique % n
+
+        # Lower band of H, for the banded Cholesky path
+        lower = row_of >= indices
+        bandwidth = int(np.max(row_of - indices)) if n > 0 else 0
+
+        self._structure = {
+            "free": free,
+            "offset": offset,
+            "n": n,
+            "keeps": keeps,
+            "inverse": inverse,
+            "num_entries": len(unique),
+            "indices": indices,
+            "indptr": np.searchsorted(row_of, np.arange(n + 1)),
+            "diagonal": np.searchsorted(unique, np.arange(n) * (n + 1)),
+            "bandwidth": bandwidth,
+            "band_entries": np.flatnonzero(lower),
+            "band_rows": (row_of - indices)[lower],
+            "band_cols": indices[lower]
+        }
+
+        return self._structure
+
+    def build_system(self, X):
+        """
+        Assembles the sparse normal equations H dx = -b over the free
+        nodes.
+
+        Returns:
+            H entries (in the order of sparsity_structure), b, cost
+        """
+
+        d = self.dof
+
+        structure = self.sparsity_structure()
+        offset = structure["offset"]
+        keeps = structure["keeps"]
+
+        r, J_i, J_j = self.linearize(X)
+        J_i = J_i[:, :, :d]
+        J_j = J_j[:, :, :d]
+
+        i, j, _, Omega, _ = self.edge_arrays()
+
+        OJ_i = Omega @ J_i
+        OJ_j = Omega @ J_j
+
+        cost = float(np.einsum("ni,ni->", r, np.einsum("nij,nj->ni", Omega, r)))
+
+        J_i_T = np.swapaxes(J_i, 1, 2)
+        J_j_T = np.swapaxes(J_j, 1, 2)
+
+        data = np.concatenate([
+            (J_i_T[keeps[0]] @ OJ_i[keeps[0]]).ravel(),
+            (J_i_T[keeps[1]] @ OJ_j[keeps[1]]).ravel(),
+            (J_j_T[keeps[2]] @ OJ_i[keeps[2]]).ravel(),
+            (J_j_T[keeps[3]] @ OJ_j[keeps[3]]).ravel(),
+            np.zeros(structure["n"])
+        ])
+
+        H = np.bincount(
+            structure["inverse"],
+            weights=data,
+            minlength=structure["num_entries"]
+        )
+
+        b = np.zeros(structure["n"])
+
+        for node, OJ in ((i, OJ_i), (j, OJ_j)):
+
+            keep = offset[node] >= 0
+            g = np.einsum("nji,nj->ni", OJ[keep], r[keep])
+
+            b += np.bincount(
+                (offset[node[keep], None] + np.arange(d)).ravel(),
+                weights=g.ravel(),
+                minlength=structure["n"]
+            )
+
+        return H, b, cost
+
+    # -------------------------------------------------------
+    # OPTIMIZATION
+    # -------------------------------------------------------
+
+    def solve(self, H, b, max_bandwidth=128):
+        """
+        Solves H dx = -b for H given as entries of sparsity_structure.
+
+        Chain-like graphs (odometry, tracking) give a narrow band and
+        are solved with a banded Cholesky factorization; other graphs
+        (e.g. with long loop edges) with a sparse LU factorization.
+        """
+
+        import scipy.linalg
+        import scipy.sparse
+        import scipy.sparse.linalg
+
+        structure = self.sparsity_structure()
+        n = structure["n"]
+
+        if structure["bandwidth"] <= max_bandwidth:
+
+            ab = np.zeros((structure["bandwidth"] + 1, n))
+            ab[structure["band_rows"], structure["band_cols"]] = H[structure["band_entries"]]
+
+            try:
+                factor = scipy.linalg.cholesky_banded(ab, lower=True)
+                return scipy.linalg.cho_solve_banded((factor, True), -b)
+            except np.linalg.LinAlgError:
+                pass
+
+        # CSR arrays of a symmetric matrix are also its CSC arrays
+        H = scipy.sparse.csc_matrix(
+            (H, structure["indices"], structure["indptr"]),
+            shape=(n, n)
+        )
+
+        # Fill-reducing ordering on the symmetric pattern
+        return scipy.sparse.linalg.spsolve(H, -b, permc_spec="MMD_AT_PLUS_A")
+
+    def optimize(self, max_iterations=20, tolerance=1e-5, initial_lambda=1e-8):
+        """
+        Levenberg-Marquardt over the free nodes, solving each damped
+        system with a banded Cholesky or sparse LU factorization.
+
+        If no node is fixed, the first one is held fixed to remove the
+        gauge freedom.
+
+        Returns:
+            final cost
+        """
+
+        import scipy.sparse
+
+        if len(self.edges_i) == 0:
+            return 0.0
+
+        if not any(self.fixed):
+            self.fixed[0] = True
+            self._structure = None
+
+        structure = self.sparsity_structure()
+
+        free = structure["free"]
+        shape = (structure["n"], structure["n"])
+
+        def as_matrix(entries):
+            # CSR arrays of a symmetric matrix are also its CSC arrays
+            return scipy.sparse.csc_matrix(
+                (entries, structure["indices"], structure["indptr"]),
+                shape=shape
+            )
+
+        X = np.array(self.nodes)
+        d = self.dof
+
+        # Damping follows the gain ratio between actual and predicted
+        # cost reduction (Nielsen's update)
+        lam = initial_lambda
+        nu = 2.0
+
+        H, b, cost = self.build_system(X)
+
+        for _ in range(max_iterations):
+
+            diagonal = np.maximum(H[structure["diagonal"]], 1e-9)
+
+            improved = False
+
+            for _ in range(10):
+
+                H_damped = H.copy()
+                H_damped[structure["diagonal"]] += lam * diagonal
+
+                dx = self.solve(H_damped, b)
+
+                delta = np.zeros((len(X), 7))
+                delta[free, :d] = dx.reshape(-1, d)
+
+                X_new = sim3_retract_batch(X, delta)
+                new_cost = self.cost(X_new)
+
+                predicted = -(2 * b @ dx + dx @ (as_matrix(H) @ dx))
+
+                if new_cost < cost and predicted > 0:
+                    improved = True
+                    break
+
+                lam *= nu
+                nu *= 2
+
+            if not improved:
+                break
+
+            rho = (cost - new_cost) / predicted
+            lam *= max(1.0 / 3.0, 1 - (2 * rho - 1) ** 3)
+            nu = 2.0
+
+            converged = (
+                cost - new_cost < tolerance * max(cost, 1e-12)
+                or np.linalg.norm(dx) < tolerance
+            )
+
+            X = X_new
+
+            H, b, cost = self.build_system(X)
+
+            if converged:
+                break
+
+        self.nodes = list(X)
+
+        return cost
+
+    def corrections(self, X_old):
+        """
+        Transforms X_new @ X_old^-1 mapping each node's old estimate to
+        its optimized one (used to move points anchored to the nodes).
+
+        X_old: Nx4x4 node estimates before optimization
+        """
+        return np.array(self.nodes) @ sim3_inverse_batch(np.asarray(X_old))
@@ -0,0 +1,267 @@
+import math
+import numpy as np
+from collections import defaultdict
+
+from geometry.projection import frustum_planes
+
+
+class VoxelGrid:
+    """
+    Hash grid of landmark positions.
+
+    Landmarks are bucketed by the integer voxel containing them, so
+    insertion, removal and moves are O(1). Positions are also kept in a
+    preallocated Nx3 array (grown geometrically, removals fill their row
+    with the last one), so whole-map tests are single vectorized passes.
+
+    A frustum query with a bounded depth visits the voxels of the
+    frustum's bounding box and tests only the points of those that
+    intersect the frustum. When the box holds more voxels than the map
+    occupies, e.g. for an unbounded or very deep frustum, testing every
+    point in one pass is cheaper and is done instead.
+    """
+
+    def __init__(self, voxel_size=1.0, capacity=1024):
+
+        self.voxel_size = float(voxel_size)
+
+        self.voxels = defaultdict(set)   # voxel key -> landmark ids
+        self.keys = {}                   # landmark_id -> voxel key
+        self.rows = {}                   # landmark_id -> row of _points
+
+        capacity = max(int(capacity), 1)
+
+        self._points = np.empty((capacity, 3))
+        self._ids = np.empty(capacity, dtype=np.int64)
+
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, landmark_id):
+        return landmark_id in self.rows
+
+    def voxel_of(self, X):
+
+        s = self.voxel_size
+
+        return (
+            math.floor(X[0] / s),
+            math.floor(X[1] / s),
+            math.floor(X[2] / s)
+        )
+
+    @property
+    def points(self):
+        """
+        Nx3 view of the stored positions, in row order.
+        """
+        return self._points[:self._size]
+
+    @property
+    def ids(self):
+        """
+        Landmark id of each row of points.
+        """
+        return self._ids[:self._size]
+
+    def point(self, landmark_id):
+        return self._points[self.rows[landmark_id]]
+
+    # -------------------------------------------------------
+    # UPDATES
+    # -------------------------------------------------------
+
+    def _grow(self, min_capacity):
+
+        capacity = len(self._points)
+
+        while capacity < min_capacity:
+            capacity *= 2
+
+        points = np.empty((capacity, 3))
+        ids = np.empty(capacity, dtype=np.int64)
+
+        points[:self._size] = self._points[:self._size]
+        ids[:self._size] = self._ids[:self._size]
+
+        self._points = points
+        self._ids = ids
+
+    def insert(self, landmark_id, X):
+        """
+        Adds a landmark, or moves it if already present.
+        """
+
+        X = np.asarray(X, dtype=np.float64)
+        key = self.voxel_of(X)
+
+        old_key = self.keys.get(landmark_id)
+
+        if old_key != key:
+
+            if old_key is not None:
+                self._discard(landmark_id, old_key)
+
+            self.voxels[key].add(landmark_id)
+            self.keys[landmark_id] = key
+
+        row = self.rows.get(landmark_id)
+
+        if row is None:
+
+            if self._size == len(self._points):
+                self._grow(self._size + 1)
+
+            row = self._size
+            self._size += 1
+
+            self._ids[row] = landmark_id
+            self.rows[landmark_id] = row
+
+        self._points[row] = X
+
+    def remove(self, landmark_id):
+
+        key = self.keys.pop(landmark_id)
+        row = self.rows.pop(landmark_id)
+
+        self._discard(landmark_id, key)
+
+        # The last row takes the freed one
+        last = self._size - 1
+
+        if row != last:
+            moved_id = int(self._ids[last])
+
+            self._points[row] = self._points[last]
+            self._ids[row] = moved_id
+            self.rows[moved_id] = row
+
+        self._size = last
+
+    def _discard(self, landmark_id, key):
+
+        voxel = self.voxels[key]
+        voxel.discard(landmark_id)
+
+        if not voxel:
+            del self.voxels[key]
+
+    # -------------------------------------------------------
+    # QUERIES
+    # -------------------------------------------------------
+
+    def query_frustum(
+        self, K, T, width, height,
+        near=0.0, far=np.inf,
+        exact=True
+    ):
+        """
+        Landmarks inside the viewing frustum of a camera.
+
+        T: 4x4 pose matrix (world to camera)
+        exact: if False, a bounded query returns every landmark of the
+               voxels that intersect the frustum (a superset, without
+               per-point tests)
+
+        Returns:
+            array of landmark ids
+        """
+
+        planes = frustum_planes(K, T, width, height, near, far)
+
+        keys = None
+
+        if np.isfinite(far):
+
+            lower, upper = self.frustum_bounds(K, T, width, height, near, far)
+
+            box = upper - lower + 1
+
+            if np.prod(box) < len(self.voxels):
+                grid = np.indices(box).reshape(3, -1).T
+                keys = grid + lower
+
+        if keys is None:
+            inside = self.points_in_frustum(self.points, planes)
+            return self.ids[inside]
+
+        keys = keys[self.voxels_in_frustum(keys, planes)]
+
+        ids = []
+
+        for key in map(tuple, keys.tolist()):
+
+            voxel = self.voxels.get(key)
+
+            if voxel:
+                ids.extend(voxel)
+
+        ids = np.array(ids, dtype=np.int64)
+
+        if not exact or len(ids) == 0:
+            return ids
+
+        rows = np.array([self.rows[i] for i in ids.tolist()])
+
+        return ids[self.points_in_frustum(self._points[rows], planes)]
+
+    def points_in_frustum(self, points, planes):
+        """
+        points: Nx3 world points
+        Returns:
+            N booleans
+        """
+
+        return np.all(points @ planes[:, :3].T + planes[:, 3] >= 0, axis=1)
+
+    def frustum_bounds(self, K, T, width, height, near, far):
+        """
+        Voxel keys bounding the frustum corners.
+
+        Returns:
+            lower, upper (inclusive) voxel keys
+        """
+
+        corners_px = np.array([
+            [0.0, 0.0, 1.0],
+            [width, 0.0, 1.0],
+            [0.0, height, 1.0],
+            [width, height, 1.0]
+        ])
+
+        rays = corners_px @ np.linalg.inv(K).T
+
+        corners = np.vstack([near * rays, far * rays])
+
+        # Camera to world
+        R = T[:3, :3]
+        t = T[:3, 3]
+        corners = (corners - t) @ R
+
+        lower = np.floor(corners.min(axis=0) / self.voxel_size).astype(np.int64)
+        upper = np.floor(corners.max(axis=0) / self.voxel_size).astype(np.int64)
+
+        return lower, upper
+
+    def voxels_in_frustum(self, keys, planes):
+        """
+        Conservative voxel/frustum test: a voxel is rejected only if it
+        lies entirely on the outer side of one plane.
+
+        keys: Mx3 voxel keys
+        Returns:
+            M booleans
+        """
+
+        half = 0.5 * self.voxel_size
+
+        centers = (keys + 0.5) * self.voxel_size
+
+        # Largest signed distance reachable within the voxel
+        reach = half * np.sum(np.abs(planes[:, :3]), axis=1)
+        distances = centers @ planes[:, :3].T + planes[:, 3] + reach
+
+        return np.all(distances >= 0, axis=1)
@@ -1,26 +1,30 @@
+import time
 import numpy as np
-from geometry.se3 import skew, se3_exp, transform_point
-from geometry.projection import project_point, projection_jacobian
+from geometry.se3 import skew_batch, se3_exp, transform_points
+from geometry.projection import project_points, projection_jacobians
 
 
-def se3_point_jacobian(X_c):
+def se3_point_jacobians(X_c):
 
-    J = np.zeros((3, 6))
-    J[:, :3] = np.eye(3)
-    J[:, 3:] = -skew(X_c)
+    J = np.zeros((len(X_c), 3, 6))
+    J[:, :, :3] = np.eye(3)
+    J[:, :, 3:] = -skew_batch(X_c)
     return J
 
 
-def compute_residual_and_jacobian(T, K, X_w, z):
+def compute_residuals_and_jacobians(T, K, points_3d, points_2d):
+    """
+    Reprojection residuals of N points and their Jacobians wrt a
+    left-multiplied SE(3) increment of T.
 
-    X_c = transform_point(T, X_w)
-    z_hat = project_point(K, X_c)
-    r = z - z_hat
+    Returns:
+        Nx2 residuals, Nx2x6 Jacobians
+    """
 
-    J_proj = projection_jacobian(K, X_c)
-    J_se3 = se3_point_jacobian(X_c)
+    X_c = transform_points(T, points_3d)
+    r = points_2d - project_points(K, X_c)
 
-    J = J_proj @ J_se3
+    J = projection_jacobians(K, X_c) @ se3_point_jacobians(X_c)
 
     return r, J
 
@@ -31,22 +35,50 @@ def gauss_newton_pose_estimation(
     points_3d,
     points_2d,
     max_iterations=10,
-    tolerance=1e-6
+    tolerance=1e-6,
+    deadline=None,
+    min_iterations=1,
+    return_info=False
 ):
+    """
+    deadline: optional time.perf_counter() value; no iteration is started
+              that would end after it, judging by the duration of the
+              previous one
+    min_iterations: iterations run regardless of the deadline (at least
+                    one)
+    return_info: also return the number of iterations run and whether
+                 the deadline stopped the optimization
+
+    Returns:
+        T, or (T, iterations, stopped_by_deadline) with return_info
+    """
 
     T = T_init.copy()
 
+    points_3d = np.asarray(points_3d, dtype=np.float64).reshape(-1, 3)
+    points_2d = np.asarray(points_2d, dtype=np.float64).reshape(-1, 2)
+
+    last_duration = None
+
+    iterations = 0
+    stopped_by_deadline = False
+
     for _ in range(max_iterations):
 
-        H = np.zeros((6, 6))
-        b = np.zeros(6)
+        iteration_start = time.perf_counter()
 
-        for X_w, z in zip(points_3d, points_2d):
+        if (
+            deadline is not None
+            and iterations >= max(min_iterations, 1)
+            and iteration_start + last_duration > deadline
+        ):
+            stopped_by_deadline = True
+            break
 
-            r, J = compute_residual_and_jacobian(T, K, X_w, z)
+        r, J = compute_residuals_and_jacobians(T, K, points_3d, points_2d)
 
-            H += J.T @ J
-            b += J.T @ r
+        H = np.einsum("nki,nkj->ij", J, J)
+        b = np.einsum("nki,nk->i", J, r)
 
         lambda_damping = 1e-3
         H_damped = H + lambda_damping * np.eye(6)
@@ -57,9 +89,20 @@ def gauss_newton_pose_estimation(
             print("Singular matrix")
             break
 
+        # A point at zero depth (e.g. after the map scale collapsed)
+        if not np.all(np.isfinite(delta)):
+            print("Degenerate pose update")
+            break
+
         T = se3_exp(delta) @ T
+        iterations += 1
 
         if np.linalg.norm(delta) < tolerance:
             break
 
+        last_duration = time.perf_counter() - iteration_start
+
+    if return_info:
+        return T, iterations, stopped_by_deadline
+
     return T
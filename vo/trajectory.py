@@ -0,0 +1,149 @@
+import numpy as np
+
+from geometry.se3 import se3_inverse_batch
+
+
+class Trajectory:
+    """
+    Sequence of SE(3) poses stored in a preallocated Nx4x4 array.
+
+    Behaves like the list of 4x4 matrices it replaces (append, len,
+    indexing, iteration) while exposing positions / rotations as
+    views on the underlying buffer. The buffer grows geometrically,
+    so appending is amortized O(1).
+    """
+
+    def __init__(self, capacity=64):
+
+        capacity = max(int(capacity), 1)
+
+        self._poses = np.empty((capacity, 4, 4))
+        self._frame_ids = np.empty(capacity, dtype=np.int64)
+        self._timestamps = np.empty(capacity)
+
+        self._size = 0
+
+    # -------------------------------------------------------
+    # STORAGE
+    # -------------------------------------------------------
+
+    def _grow(self, min_capacity):
+
+        capacity = len(self._poses)
+
+        while capacity < min_capacity:
+            capacity *= 2
+
+        poses = np.empty((capacity, 4, 4))
+        frame_ids = np.empty(capacity, dtype=np.int64)
+        timestamps = np.empty(capacity)
+
+        poses[:self._size] = self._poses[:self._size]
+        frame_ids[:self._size] = self._frame_ids[:self._size]
+        timestamps[:self._size] = self._timestamps[:self._size]
+
+        self._poses = poses
+        self._frame_ids = frame_ids
+        self._timestamps = timestamps
+
+    def append(self, T, frame_id=None, timestamp=None):
+        """
+        Appends a 4x4 pose.
+
+        frame_id defaults to the index of the pose, timestamp to NaN.
+        """
+
+        if self._size == len(self._poses):
+            self._grow(self._size + 1)
+
+        i = self._size
+
+        self._poses[i] = T
+        self._frame_ids[i] = i if frame_id is None else frame_id
+        self._timestamps[i] = np.nan if timestamp is None else timestamp
+
+        self._size += 1
+
+    def extend(self, poses):
+
+        for T in poses:
+            self.append(T)
+
+    # -------------------------------------------------------
+    # LIST INTERFACE
+    # -------------------------------------------------------
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, index):
+        """
+        Integer index -> 4x4 view, slice -> Kx4x4 view.
+        """
+        return self.poses[index]
+
+    def __iter__(self):
+        return iter(self.poses)
+
+    def __array__(self, dtype=None, copy=None):
+
+        if copy:
+            return np.array(self.poses, dtype=dtype)
+
+        if dtype is None:
+            return self.poses
+
+        return self.poses.astype(dtype, copy=False)
+
+    # -------------------------------------------------------
+    # VIEWS
+    # -------------------------------------------------------
+
+    @property
+    def poses(self):
+        """
+        Nx4x4 view of the stored poses.
+        """
+        return self._poses[:self._size]
+
+    @property
+    def positions(self):
+        """
+        Nx3 view of the translation part.
+        """
+        return self._poses[:self._size, :3, 3]
+
+    @property
+    def rotations(self):
+        """
+        Nx3x3 view of the rotation part.
+        """
+        return self._poses[:self._size, :3, :3]
+
+    @property
+    def frame_ids(self):
+        return self._frame_ids[:self._size]
+
+    @property
+    def timestamps(self):
+        return self._timestamps[:self._size]
+
+    def relative(self, k=1):
+        """
+        Relative transforms T_i^-1 @ T_{i+k} for all valid i.
+
+        Computed in one batched product over views of the buffer.
+
+        Returns:
+            (N-k)x4x4 array
+        """
+
+        if k < 1:
+            raise ValueError("k must be positive")
+
+        poses = self.poses
+
+        if len(poses) <= k:
+            return np.empty((0, 4, 4))
+
+        return se3_inverse_batch(poses[:-k]) @ poses[k:]
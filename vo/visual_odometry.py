@@ -1,29 +1,186 @@
+import time
 import numpy as np
 
-from vo.initialization import initialize_two_view
+from vo.initialization import initialize_two_view, select_initialization_pair
 from vo.tracking import gauss_newton_pose_estimation
-from vo.data_association import match_descriptors
-from geometry.triangulation import triangulate_point
-from geometry.se3 import transform_point
+from vo.data_association import match_descriptors, bucket_subsample
+from vo.trajectory import Trajectory
+from vo.spatial_index import VoxelGrid
+from vo.pose_graph import PoseGraph, TRACKING_INFORMATION, ODOMETRY_INFORMATION
+from geometry.triangulation import triangulate_points_multiview
+from geometry.se3 import transform_points, se3_inverse_batch, pose2d_to_se3
+from geometry.sim3 import sim3_scale_batch
+
+
+# Weight of the newest sample in the real-time cost estimates
+COST_SMOOTHING = 0.2
+
+# Degradations that change the tracked pose
+TRACKING_DEGRADATIONS = ("subsampled", "gn_iterations", "gn_deadline")
+
+
+def update_cost(cost, sample):
+
+    if cost is None:
+        return sample
+
+    return cost + COST_SMOOTHING * (sample - cost)
 
 
 class VisualOdometry:
 
-    def __init__(self, K):
+    def __init__(
+        self, K,
+        match_threshold=0.5,
+        max_iterations=10,
+        min_triangulation_angle=1.0,
+        descriptor_codec=None,
+        pq=None,
+        rerank=4,
+        keyframe_database=None,
+        keyframe_interval=5,
+        min_loop_gap=30,
+        odometry=None,
+        camera_transform=None,
+        pose_graph_interval=0,
+        image_size=None,
+        voxel_size=1.0,
+        frame_budget=None,
+        min_correspondences=30,
+        min_gn_iterations=3,
+        bucket_grid=(8, 6)
+    ):
 
         self.K = K
 
-        self.poses = []
+        self.match_threshold = match_threshold
+        self.max_iterations = max_iterations
+        self.min_triangulation_angle = np.deg2rad(min_triangulation_angle)
+
+        # Descriptors arrive encoded by descriptor_codec (if any);
+        # pq switches matching to product-quantized distances
+        self.descriptor_codec = descriptor_codec
+        self.pq = pq
+        self.rerank = rerank
+
+        # Place recognition: every keyframe_interval-th frame is queried
+        # against keyframes at least min_loop_gap frames older, then added
+        self.keyframe_database = keyframe_database
+        self.keyframe_interval = keyframe_interval
+        self.min_loop_gap = min_loop_gap
+        self.loops = []   # (frame_id, keyframe_id, inliers)
+
+        # Pose graph: planar robot odometry per frame id (Nx3) and the
+        # camera-to-robot transform; optimized every pose_graph_interval
+        # frames (0 disables)
+        self.odometry = odometry
+        self.camera_transform = camera_transform
+        self.pose_graph_interval = pose_graph_interval
+
+        self.poses = Trajectory()
         self.landmarks = {}   # landmark_id -> 3D point
+        self.landmark_frames = {}   # landmark_id -> last frame observing it
+
+        # Spatial index over self.landmarks for map-wide visibility
+        # queries; image_size (width, height) defaults to twice the
+        # principal point
+        self.landmark_index = VoxelGrid(voxel_size)
+
+        if image_size is None:
+            image_size = (2 * K[0, 2], 2 * K[1, 2])
+
+        self.image_size = image_size
+
+        # Real-time mode: with a frame_budget (seconds), process_frame
+        # subsamples correspondences (keeping at least min_correspondences,
+        # spread over bucket_grid), caps Gauss-Newton iterations (keeping
+        # at least min_gn_iterations) and defers landmark creation to the
+        # next frame to meet it. Tracking is only degraded while healthy
+        # (see tracking_healthy), otherwise done in full, and a degraded
+        # pose is re-estimated from all its correspondences before the map
+        # or the next frame builds on it. That, keyframes and pose graph
+        # runs are left to run_deferred(), called between frames.
+        # Costs are measured online; frame_reports records what was
+        # degraded, and which frames lost tracking.
+        self.frame_budget = frame_budget
+        self.min_correspondences = min_correspondences
+        self.min_gn_iterations = min_gn_iterations
+        self.bucket_grid = bucket_grid
+
+        self.gn_cost = None         # seconds per correspondence and iteration
+        self.creation_cost = None   # seconds per untracked match
+        self.tail_cost = None       # seconds of bookkeeping after tracking
+        self.deferred = None        # create_landmarks arguments
+        self.deferred_refinement = None   # correspondences of a degraded pose
+        self.deferred_keyframes = []   # process_keyframe arguments
+        self.pose_graph_due = False
+        self.frame_reports = []
 
         self.next_landmark_id = 0
 
         self.initialized = False
 
+        self.frame_count = 0
+
         self.prev_keypoints = None
         self.prev_descriptors = None
+        self.prev_codes = None   # PQ codes of prev_descriptors
         self.prev_landmark_ids = None
 
+    # -------------------------------------------------------
+    # DATA ASSOCIATION
+    # -------------------------------------------------------
+
+    def decode_descriptors(self, descriptors):
+
+        if self.descriptor_codec is None:
+            return descriptors
+
+        return self.descriptor_codec.decode(descriptors)
+
+    def encode_pq(self, descriptors):
+        """
+        PQ codes of a frame's descriptors (None without PQ).
+        """
+
+        if self.pq is None:
+            return None
+
+        return self.pq.encode(self.decode_descriptors(descriptors))
+
+    def match(self, desc1, desc2, codes1=None):
+        """
+        Matches the descriptors of an earlier frame (desc1) with a new
+        one (desc2).
+
+        With PQ, the new frame is the query and desc1 the coded side, so
+        its cached codes1 are reused; they are computed if omitted.
+
+        Returns:
+            list of (index_in_desc1, index_in_desc2)
+        """
+
+        if self.pq is None:
+            return match_descriptors(
+                self.decode_descriptors(desc1),
+                self.decode_descriptors(desc2),
+                distance_threshold=self.match_threshold
+            )
+
+        if codes1 is None:
+            codes1 = self.encode_pq(desc1)
+
+        matches = match_descriptors(
+            self.decode_descriptors(desc2),
+            self.decode_descriptors(desc1),
+            distance_threshold=self.match_threshold,
+            pq=self.pq,
+            codes2=codes1,
+            rerank=self.rerank
+        )
+
+        return sorted((i, j) for j, i in matches)
+
     # -------------------------------------------------------
     # INITIALIZATION
     # -------------------------------------------------------
@@ -33,7 +190,7 @@ class VisualOdometry:
         kpts1, desc1
     ):
 
-        matches = match_descriptors(desc0, desc1)
+        matches = self.match(desc0, desc1)
 
         if len(matches) < 8:
             print("Not enough matches for initialization")
@@ -44,36 +201,164 @@ class VisualOdometry:
 
         T0, T1, points_3d = initialize_two_view(self.K, pts0, pts1)
 
-        self.poses.append(T0)
-        self.poses.append(T1)
+        self.poses.append(T0, frame_id=0)
+        self.poses.append(T1, frame_id=1)
 
         self.prev_landmark_ids = [None] * len(kpts1)
 
         for (idx0, idx1), X in zip(matches, points_3d):
 
-            landmark_id = self.next_landmark_id
-            self.next_landmark_id += 1
-
-            self.landmarks[landmark_id] = X
+            landmark_id = self.add_landmark(X, 0)
             self.prev_landmark_ids[idx1] = landmark_id
 
         self.prev_keypoints = kpts1
         self.prev_descriptors = desc1
+        self.prev_codes = self.encode_pq(desc1)
 
         self.initialized = True
+        self.frame_count = 2
 
         print(f"Initialization complete with {len(self.landmarks)} landmarks")
 
+    def process_initialization(
+        self, frames,
+        window=8,
+        num_workers=4,
+        min_inliers=50,
+        min_parallax=3.0
+    ):
+        """
+        Initializes from the best pair (0, k) among the first frames
+        and tracks the frames in between against the resulting map.
+
+        frames: list of (keypoints, descriptors)
+
+        Returns:
+            index of the first frame left to process_frame,
+            or None if no pair could be initialized
+        """
+
+        search_frames = [
+            (kpts, self.decode_descriptors(desc))
+            for kpts, desc in frames[:window + 1]
+        ]
+
+        candidate = select_initialization_pair(
+            self.K, search_frames,
+            window=window,
+            num_workers=num_workers,
+            min_inliers=min_inliers,
+            min_parallax=min_parallax,
+            match_threshold=self.match_threshold
+        )
+
+        if candidate is None:
+            print("No frame pair suitable for initialization")
+            return None
+
+        k = candidate["frame_index"]
+
+        kpts0, desc0 = frames[0]
+        kpts1, desc1 = frames[k]
+
+        landmark_ids0 = [None] * len(kpts0)
+        self.prev_landmark_ids = [None] * len(kpts1)
+
+        for (idx0, idx1), X, inlier in zip(
+            candidate["matches"],
+            candidate["points_3d"],
+            candidate["inliers"]
+        ):
+
+            if not inlier:
+                continue
+
+            landmark_id = self.add_landmark(X, 0)
+            landmark_ids0[idx0] = landmark_id
+            self.prev_landmark_ids[idx1] = landmark_id
+
+        self.poses.append(candidate["T0"], frame_id=0)
+
+        # Frames between the pair only get a pose, the map comes from (0, k)
+        T_prev = candidate["T0"]
+
+        codes0 = self.encode_pq(desc0)
+
+        for frame_id in range(1, k):
+
+            kpts, desc = frames[frame_id]
+
+            matches = self.match(desc0, desc, codes0)
+
+            points_3d = []
+            points_2d = []
+
+            for idx0, idx_curr in matches:
+
+                landmark_id = landmark_ids0[idx0]
+
+                if landmark_id is not None:
+                    points_3d.append(self.landmarks[landmark_id])
+                    points_2d.append(kpts[idx_curr])
+
+            if len(points_3d) < 6:
+                print("Not enough correspondences")
+                continue
+
+            T_prev = gauss_newton_pose_estimation(
+                T_prev,
+                self.K,
+                np.array(points_3d),
+                np.array(points_2d),
+                max_iterations=self.max_iterations
+            )
+
+            self.poses.append(T_prev, frame_id=frame_id)
+
+        self.poses.append(candidate["T1"], frame_id=k)
+
+        self.prev_keypoints = kpts1
+        self.prev_descriptors = desc1
+        self.prev_codes = self.encode_pq(desc1)
+
+        self.initialized = True
+        self.frame_count = k + 1
+
+        print(
+            f"Initialization from frames (0, {k}) complete with "
+            f"{len(self.landmarks)} landmarks, "
+            f"parallax {candidate['parallax']:.2f} deg"
+        )
+
+        return k + 1
+
     # -------------------------------------------------------
     # TRACKING
     # -------------------------------------------------------
 
-    def process_frame(self, kpts, descriptors):
+    def process_frame(self, kpts, descriptors, codes=None):
+        """
+        codes: PQ codes of the descriptors if precomputed (e.g. at load
+               time); otherwise encoded once here when PQ is enabled
+        """
 
         if not self.initialized:
             raise RuntimeError("System not initialized")
 
-        matches = match_descriptors(self.prev_descriptors, descriptors)
+        start = time.perf_counter()
+
+        deadline = None
+        if self.frame_budget is not None:
+            deadline = start + self.frame_budget
+
+        # Work deferred by the previous frame, unless done in between
+        self.refine_degraded_pose()
+        self.create_deferred_landmarks()
+
+        frame_id = self.frame_count
+        self.frame_count += 1
+
+        matches = self.match(self.prev_descriptors, descriptors, self.prev_codes)
 
         points_3d = []
         points_2d = []
@@ -86,25 +371,105 @@ class VisualOdometry:
                 points_3d.append(self.landmarks[landmark_id])
                 points_2d.append(kpts[idx_curr])
 
+        report = {
+            "frame_id": frame_id,
+            "correspondences": len(points_3d),
+            "degradations": []
+        }
+
         if len(points_3d) < 6:
+
+            if deadline is not None:
+                report["tracking_lost"] = True
+                report["latency"] = time.perf_counter() - start
+                self.frame_reports.append(report)
+
             print("Not enough correspondences")
             return
 
         points_3d = np.array(points_3d)
         points_2d = np.array(points_2d)
 
+        all_correspondences = (points_3d, points_2d)
+
+        max_iterations = self.max_iterations
+
+        # A degraded pose on weak tracking risks losing track, which is
+        # worse than a late pose: tracking then ignores the budget
+        tracking_deadline = None
+
+        if deadline is not None and not self.tracking_healthy(len(points_3d)):
+            report["tracked_in_full"] = True
+
+        elif deadline is not None:
+
+            # Time left once the rest of the frame is accounted for
+            tracking_deadline = deadline - (self.tail_cost or 0.0)
+
+            num_points, max_iterations = self.plan_tracking(
+                len(points_3d), tracking_deadline - time.perf_counter()
+            )
+
+            if num_points < len(points_3d):
+
+                width, height = self.image_size
+
+                selected = bucket_subsample(
+                    points_2d, num_points, width, height,
+                    grid=self.bucket_grid
+                )
+
+                points_3d = points_3d[selected]
+                points_2d = points_2d[selected]
+
+                report["degradations"].append("subsampled")
+
+            if max_iterations < self.max_iterations:
+                report["degradations"].append("gn_iterations")
+
+        report["used_correspondences"] = len(points_3d)
+        report["gn_iterations"] = max_iterations
+
         T_init = self.poses[-1]
 
-        T_new = gauss_newton_pose_estimation(
+        gn_start = time.perf_counter()
+
+        T_new, iterations, stopped_by_deadline = gauss_newton_pose_estimation(
             T_init,
             self.K,
             points_3d,
-            points_2d
+            points_2d,
+            max_iterations=max_iterations,
+            deadline=tracking_deadline,
+            min_iterations=self.min_gn_iterations,
+            return_info=True
         )
 
-        self.poses.append(T_new)
+        report["gn_iterations_run"] = iterations
+
+        if stopped_by_deadline:
+            report["degradations"].append("gn_deadline")
+
+        if iterations > 0:
+            self.gn_cost = update_cost(
+                self.gn_cost,
+                (time.perf_counter() - gn_start) / (len(points_3d) * iterations)
+            )
+
+        self.poses.append(T_new, frame_id=frame_id)
+
+        degraded = any(
+            d in report["degradations"] for d in TRACKING_DEGRADATIONS
+        )
+
+        if degraded:
+            self.deferred_refinement = all_correspondences
+
+        tail_start = time.perf_counter()
+        creation_time = 0.0
 
         current_landmark_ids = [None] * len(kpts)
+        untracked = []
 
         for idx_prev, idx_curr in matches:
 
@@ -112,43 +477,414 @@ class VisualOdometry:
 
             if landmark_id is not None:
                 current_landmark_ids[idx_curr] = landmark_id
+                self.landmark_frames[landmark_id] = frame_id
+            else:
+                untracked.append((idx_prev, idx_curr))
+
+        if untracked:
+
+            idx_prev, idx_curr = np.array(untracked).T
+
+            creation = (
+                frame_id,
+                self.poses[-2].copy(),
+                T_new,
+                np.asarray(self.prev_keypoints)[idx_prev],
+                np.asarray(kpts)[idx_curr],
+                idx_curr,
+                current_landmark_ids
+            )
+
+            # Landmarks are not triangulated from a degraded pose
+            if degraded or (
+                deadline is not None
+                and self.creation_cost is not None
+                and time.perf_counter() + self.creation_cost * len(untracked)
+                > deadline - (self.tail_cost or 0.0)
+            ):
+                self.deferred = creation
+                report["degradations"].append("landmarks_deferred")
 
             else:
-                # triangulate new point
-                pt_prev = self.prev_keypoints[idx_prev]
-                pt_curr = kpts[idx_curr]
-
-                X = triangulate_point(
-                    self.K,
-                    self.poses[-2],
-                    T_new,
-                    pt_prev,
-                    pt_curr
+                creation_start = time.perf_counter()
+
+                self.create_landmarks(*creation)
+
+                creation_time = time.perf_counter() - creation_start
+
+                self.creation_cost = update_cost(
+                    self.creation_cost, creation_time / len(untracked)
                 )
 
-                X_cam_prev = transform_point(self.poses[-2], X)
-                X_cam_curr = transform_point(T_new, X)
+        if codes is None:
+            codes = self.encode_pq(descriptors)
 
-                if X_cam_prev[2] > 0 and X_cam_curr[2] > 0:
+        self.prev_keypoints = kpts
+        self.prev_descriptors = descriptors
+        self.prev_codes = codes
+        self.prev_landmark_ids = current_landmark_ids
 
-                    # triangulation angle filter
-                    r1 = X_cam_prev / np.linalg.norm(X_cam_prev)
-                    r2 = X_cam_curr / np.linalg.norm(X_cam_curr)
+        if (
+            self.keyframe_database is not None
+            and frame_id % self.keyframe_interval == 0
+        ):
+            if deadline is None:
+                self.process_keyframe(frame_id, kpts, descriptors)
+            else:
+                self.deferred_keyframes.append((frame_id, kpts, descriptors))
+
+        if (
+            self.pose_graph_interval > 0
+            and frame_id % self.pose_graph_interval == 0
+        ):
+            if deadline is None:
+                self.optimize_pose_graph()
+            else:
+                self.pose_graph_due = True
 
-                    cos_angle = np.clip(np.dot(r1, r2), -1.0, 1.0)
-                    angle = np.arccos(cos_angle)
+        if deadline is not None:
 
-                    min_angle = np.deg2rad(1.0)
+            end = time.perf_counter()
 
-                    if angle > min_angle:
-                        landmark_id = self.next_landmark_id
-                        self.next_landmark_id += 1
+            self.tail_cost = update_cost(
+                self.tail_cost, end - tail_start - creation_time
+            )
 
-                        self.landmarks[landmark_id] = X
-                        current_landmark_ids[idx_curr] = landmark_id
+            report["latency"] = end - start
+            self.frame_reports.append(report)
 
-        self.prev_keypoints = kpts
-        self.prev_descriptors = descriptors
-        self.prev_landmark_ids = current_landmark_ids
+        if report["degradations"]:
+            print(
+                f"Frame processed. Total landmarks: {len(self.landmarks)} "
+                f"(degraded: {', '.join(report['degradations'])})"
+            )
+        else:
+            print(f"Frame processed. Total landmarks: {len(self.landmarks)}")
+
+    def tracking_healthy(self, num_points):
+        """
+        Whether this frame's tracking may be degraded: it has more than
+        min_correspondences, the previous frame was tracked in full, and
+        the correspondences are not falling while below twice the floor.
+        Degrading frames in a row, or while the map thins out, lets the
+        pose errors add up until tracking is lost.
+        """
+
+        if num_points <= self.min_correspondences:
+            return False
+
+        if not self.frame_reports:
+            return True
+
+        previous = self.frame_reports[-1]
+
+        if previous.get("tracking_lost"):
+            return False
+
+        if any(d in previous["degradations"] for d in TRACKING_DEGRADATIONS):
+            return False
+
+        return not (
+            num_points < previous["correspondences"]
+            and num_points < 2 * self.min_correspondences
+        )
+
+    def plan_tracking(self, num_points, remaining):
+        """
+        Correspondences and Gauss-Newton iterations that fit in the
+        remaining time, from the measured cost per correspondence and
+        iteration. Correspondences are reduced first (down to
+        min_correspondences), then iterations (down to
+        min_gn_iterations).
+
+        Returns:
+            number of correspondences, max iterations
+        """
+
+        if self.gn_cost is None:
+            return num_points, self.max_iterations
+
+        affordable = remaining / self.gn_cost   # correspondence-iterations
+
+        if num_points * self.max_iterations <= affordable:
+            return num_points, self.max_iterations
+
+        used = max(
+            int(affordable // self.max_iterations),
+            min(num_points, self.min_correspondences)
+        )
+
+        iterations = int(np.clip(
+            affordable // used,
+            min(self.min_gn_iterations, self.max_iterations),
+            self.max_iterations
+        ))
+
+        return used, iterations
+
+    def create_landmarks(
+        self, frame_id, T_prev, T_curr,
+        pts_prev, pts_curr, idx_curr, landmark_ids
+    ):
+        """
+        Triangulates untracked matches between two consecutive frames in
+        one batch, keeping points in front of both cameras with enough
+        triangulation angle.
+
+        pts_prev, pts_curr: Nx2 matched keypoints
+        idx_curr: keypoint index of each match in the later frame
+        landmark_ids: landmark id per keypoint of the later frame, filled
+                      in for the new landmarks
+        """
+
+        points_3d, _, _ = triangulate_points_multiview(
+            self.K, np.array([T_prev, T_curr]),
+            np.stack([pts_prev, pts_curr], axis=1)
+        )
+
+        X_cam_prev = transform_points(T_prev, points_3d)
+        X_cam_curr = transform_points(T_curr, points_3d)
+
+        # triangulation angle filter
+        r1 = X_cam_prev / np.linalg.norm(X_cam_prev, axis=1, keepdims=True)
+        r2 = X_cam_curr / np.linalg.norm(X_cam_curr, axis=1, keepdims=True)
+
+        cos_angle = np.clip(np.sum(r1 * r2, axis=1), -1.0, 1.0)
+        angle = np.arccos(cos_angle)
+
+        keep = (
+            (X_cam_prev[:, 2] > 0)
+            & (X_cam_curr[:, 2] > 0)
+            & (angle > self.min_triangulation_angle)
+        )
+
+        for i in np.flatnonzero(keep):
+
+            landmark_id = self.add_landmark(points_3d[i], frame_id)
+            landmark_ids[idx_curr[i]] = landmark_id
+
+    def run_deferred(self):
+        """
+        Runs the work budgeted frames leave for between frames: the
+        refinement of a degraded pose, landmark creation, keyframes and
+        the periodic pose graph optimization, in the order they would
+        have run inline.
+
+        The time spent is added to the latest frame report as
+        deferred_time.
+
+        Returns:
+            seconds spent
+        """
+
+        start = time.perf_counter()
+
+        self.refine_degraded_pose()
+        self.create_deferred_landmarks()
+
+        for keyframe in self.deferred_keyframes:
+            self.process_keyframe(*keyframe)
+
+        self.deferred_keyframes = []
+
+        if self.pose_graph_due:
+            self.pose_graph_due = False
+            self.optimize_pose_graph()
+
+        elapsed = time.perf_counter() - start
+
+        if self.frame_reports:
+            report = self.frame_reports[-1]
+            report["deferred_time"] = report.get("deferred_time", 0.0) + elapsed
+
+        return elapsed
+
+    def refine_degraded_pose(self):
+        """
+        Re-estimates the latest pose from all its correspondences if its
+        tracking was degraded, starting from the degraded estimate, so
+        that the landmarks triangulated from it and the next frame start
+        from a full-quality pose.
+        """
+
+        if self.deferred_refinement is None:
+            return
+
+        points_3d, points_2d = self.deferred_refinement
+        self.deferred_refinement = None
+
+        T = gauss_newton_pose_estimation(
+            self.poses[-1],
+            self.K,
+            points_3d,
+            points_2d,
+            max_iterations=self.max_iterations
+        )
+
+        self.poses[-1][:] = T
+
+        if self.deferred is not None:
+            creation = list(self.deferred)
+            creation[2] = T
+            self.deferred = tuple(creation)
+
+    def create_deferred_landmarks(self):
+        """
+        Creates the landmarks a late frame deferred. Runs at the start of
+        the next frame, or earlier if the caller has idle time.
+        """
+
+        if self.deferred is None:
+            return
+
+        creation = self.deferred
+        self.deferred = None
+
+        self.create_landmarks(*creation)
+
+    # -------------------------------------------------------
+    # MAP
+    # -------------------------------------------------------
+
+    def add_landmark(self, X, frame_id):
+
+        landmark_id = self.next_landmark_id
+        self.next_landmark_id += 1
+
+        self.landmarks[landmark_id] = X
+        self.landmark_frames[landmark_id] = frame_id
+        self.landmark_index.insert(landmark_id, X)
+
+        return landmark_id
+
+    def visible_landmarks(self, T=None, near=0.0, far=np.inf):
+        """
+        Landmarks inside the viewing frustum of pose T (world to
+        camera), by default the latest pose.
+
+        near, far: depth bounds in map units. The map of a monocular
+                   run has an arbitrary scale, so metric camera limits
+                   do not apply; by default the depth is unbounded.
+
+        Returns:
+            array of landmark ids
+        """
+
+        if T is None:
+            T = self.poses[-1]
+
+        width, height = self.image_size
+
+        return self.landmark_index.query_frustum(
+            self.K, T, width, height, near=near, far=far
+        )
+
+    # -------------------------------------------------------
+    # POSE GRAPH
+    # -------------------------------------------------------
+
+    def optimize_pose_graph(self):
+        """
+        Redistributes drift over the whole trajectory with a Sim(3)
+        pose graph.
+
+        Nodes are the camera-to-world poses. Consecutive poses are
+        linked by their tracked relative motion and, if odometry is
+        available, by the metric camera motion derived from it.
+        Landmarks follow the correction of the last frame observing
+        them, so tracking can continue on the corrected map.
+
+        Returns:
+            final cost of the optimization
+        """
+
+        if len(self.poses) < 2:
+            return 0.0
+
+        # Deferred landmarks are triangulated from the poses before correction
+        self.refine_degraded_pose()
+        self.create_deferred_landmarks()
+
+        frame_ids = self.poses.frame_ids
+        X_old = se3_inverse_batch(np.array(self.poses))
+
+        graph = PoseGraph(similarity=True)
+
+        for k, X in enumerate(X_old):
+            graph.add_node(X, fixed=(k == 0))
+
+        Z_tracking = se3_inverse_batch(X_old[:-1]) @ X_old[1:]
+
+        for k, Z in enumerate(Z_tracking):
+            graph.add_edge(k, k + 1, Z, information=TRACKING_INFORMATION)
+
+        if self.odometry is not None:
+
+            camera_transform = self.camera_transform
+            if camera_transform is None:
+                camera_transform = np.eye(4)
+
+            C = np.array([
+                pose2d_to_se3(*self.odometry[frame_id]) @ camera_transform
+                for frame_id in frame_ids
+            ])
+
+            Z_odometry = se3_inverse_batch(C[:-1]) @ C[1:]
+
+            for k, Z in enumerate(Z_odometry):
+                graph.add_edge(
+                    k, k + 1, Z,
+                    information=ODOMETRY_INFORMATION,
+                    metric=True
+                )
+
+        cost = graph.optimize()
+
+        X_new = np.array(graph.nodes)
+        corrections = graph.corrections(X_old)
+
+        # Back to world-to-camera SE(3) poses
+        R = X_new[:, :3, :3] / sim3_scale_batch(X_new)[:, None, None]
+
+        T_new = np.zeros_like(X_new)
+        T_new[:, :3, :3] = np.swapaxes(R, 1, 2)
+        T_new[:, :3, 3] = -np.einsum("nji,nj->ni", R, X_new[:, :3, 3])
+        T_new[:, 3, 3] = 1.0
+
+        self.poses.poses[:] = T_new
+
+        node_of_frame = {frame_id: k for k, frame_id in enumerate(frame_ids.tolist())}
+
+        for landmark_id, X in self.landmarks.items():
+
+            S = corrections[node_of_frame[self.landmark_frames[landmark_id]]]
+            self.landmarks[landmark_id] = S[:3, :3] @ X + S[:3, 3]
+            self.landmark_index.insert(landmark_id, self.landmarks[landmark_id])
+
+        return cost
+
+    # -------------------------------------------------------
+    # PLACE RECOGNITION
+    # -------------------------------------------------------
+
+    def process_keyframe(self, frame_id, kpts, descriptors):
+
+        descriptors = self.decode_descriptors(descriptors)
+
+        loop = self.keyframe_database.detect_loop(
+            self.K, kpts, descriptors,
+            max_keyframe_id=frame_id - self.min_loop_gap,
+            match_threshold=self.match_threshold
+        )
+
+        if loop is not None:
+
+            keyframe_id, score, inliers = loop
+            self.loops.append((frame_id, keyframe_id, inliers))
+
+            print(
+                f"Loop detected: frame {frame_id} -> keyframe {keyframe_id} "
+                f"(score {score:.2f}, {inliers} inliers)"
+            )
 
-        print(f"Frame processed. Total landmarks: {len(self.landmarks)}")
\ No newline at end of file
+        self.keyframe_database.add_keyframe(frame_id, kpts, descriptors)
\ No newline at end of file